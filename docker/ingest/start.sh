@@ -12,9 +12,10 @@ else
 fi
 
 PYTHON=$(which python)
-COMMAND="$PYTHON -m fedimapper.cli crawl --num-processes=${NUM_PROCESSES:-4}"
+COMMAND="$PYTHON -m fedimapper.cli crawl --num-processes=${NUM_PROCESSES:-4} --concurrency=${QUEUE_INGEST_CONCURRENCY:-1}"
 
 echo "System will utilize ${NUM_PROCESSES:-4} nodes for data ingestion and an additional process for management."
+echo "Each node will ingest up to ${QUEUE_INGEST_CONCURRENCY:-1} hosts at a time."
 
 if [[ "$RELOAD" == "true" ]]; then
   set -x
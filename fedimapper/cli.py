@@ -3,14 +3,21 @@ import json
 import sqlite3
 import sys
 from functools import wraps
+from pathlib import Path
+from typing import List
 
 import typer
 from fastapi.encoders import jsonable_encoder
 from ruamel.yaml import YAML
 from tld.utils import update_tld_names
 
-from fedimapper.run import get_next_instance
-from fedimapper.services import mastodon, nodeinfo, www
+from fedimapper.run import (
+    bootstrap_instances,
+    get_backlog_age,
+    get_next_instance,
+    release_claims,
+)
+from fedimapper.services import mastodon, nodeinfo, politeness, www
 from fedimapper.settings import settings
 from fedimapper.tasks import ingest
 from fedimapper.tasks.ingest import ingest_host
@@ -44,17 +51,19 @@ def generate_openapi_spec():
 @app.command()
 @syncify
 async def instance_nodeinfo(host: str):
-    pretty_print(await nodeinfo.get_nodeinfo(www.get_node_actual_host(host)))
+    pretty_print(await nodeinfo.get_nodeinfo(await www.get_node_actual_host(host)))
 
 
 @app.command()
-def instance(host: str):
-    pretty_print(mastodon.get_metadata(www.get_node_actual_host(host)))
+@syncify
+async def instance(host: str):
+    pretty_print(await mastodon.get_metadata(await www.get_node_actual_host(host)))
 
 
 @app.command()
-def instance_version(host: str):
-    metadata = mastodon.get_metadata(www.get_node_actual_host(host))
+@syncify
+async def instance_version(host: str):
+    metadata = await mastodon.get_metadata(await www.get_node_actual_host(host))
     if not metadata:
         typer.echo("Unable to get metadata.")
         sys.exit(1)
@@ -67,66 +76,241 @@ def instance_version(host: str):
 
 
 @app.command()
-def instance_peers(host: str):
-    pretty_print(mastodon.get_peers(www.get_node_actual_host(host)))
+@syncify
+async def instance_peers(host: str):
+    pretty_print(await mastodon.get_peers(await www.get_node_actual_host(host)))
 
 
 @app.command()
-def instance_blocks(host: str):
-    pretty_print(mastodon.get_blocked_instances(www.get_node_actual_host(host)))
+@syncify
+async def instance_blocks(host: str):
+    pretty_print(await mastodon.get_blocked_instances(await www.get_node_actual_host(host)))
 
 
 @app.command()
 @syncify
-async def ingest_instance(host: str):
+async def ingest_instance(host: str, isolated: bool = typer.Option(False, hidden=True)):
     from fedimapper.services import db_session
 
     async with db_session.get_session() as session:
-        await ingest.ingest_host(session, host)
+        result = await ingest.ingest_host(session, host, isolated=isolated)
         typer.echo("Ingest complete.")
+    # Crawlers running this in isolation read the exit code to learn whether the ingest worked.
+    if isolated and not result:
+        raise typer.Exit(1)
 
 
 @app.command()
 @syncify
 async def crawl(
     num_processes: int = typer.Option(None),
+    concurrency: int = typer.Option(1),
+    min_processes: int = typer.Option(None, help="Let the worker pool shrink to this size."),
+    max_processes: int = typer.Option(None, help="Let the worker pool grow to this size."),
+    start_method: str = typer.Option("forkserver", help="How worker processes are started."),
 ):
     typer.echo("Update TLD database.")
     update_tld_names()
+    await bootstrap_instances()
     typer.echo("Run queue processing.")
 
-    queue_settings = QueueSettings(num_processes=num_processes, lookup_block_size=num_processes * 4)
-
-    runner = QueueRunner("ingest", reader=ingest_host, writer=get_next_instance, settings=queue_settings)
-    await runner.main()
+    queue_settings = QueueSettings(
+        num_processes=num_processes,
+        concurrency=concurrency,
+        min_processes=min_processes,
+        max_processes=max_processes,
+        lookup_block_size=(max_processes or num_processes) * concurrency * 4,
+        start_method=start_method,
+        preload_modules=["fedimapper.tasks.preload"],
+    )
+
+    runner = QueueRunner(
+        "ingest",
+        reader=ingest_host,
+        writer=get_next_instance,
+        settings=queue_settings,
+        limiter=politeness.origin_limiter,
+        release=release_claims,
+        backlog=get_backlog_age,
+    )
+    try:
+        await runner.main()
+    finally:
+        await release_claims()
 
 
 @app.command()
 @syncify
-async def profile_ingest(num_instances: int = typer.Option(5), sort_by: str = typer.Option("tottime")):
+async def profile_ingest(
+    num_instances: int = typer.Option(5),
+    sort_by: str = typer.Option("tottime"),
+    record: Path = typer.Option(None, help="Save every response to this corpus file."),
+    replay: Path = typer.Option(None, help="Serve every response from this corpus file instead of the network."),
+):
     import cProfile
 
+    from fedimapper.services import db_session
+    from fedimapper.services import replay as replay_service
+
     typer.echo("Update TLD database.")
     update_tld_names()
-    typer.echo("Run queue processing.")
 
-    from fedimapper.services import db_session
+    corpus = None
+    if record:
+        corpus = replay_service.start_recording(record)
+    elif replay:
+        corpus = replay_service.start_replay(replay)
 
+    typer.echo("Run queue processing.")
     async with db_session.get_session() as session:
         pr = cProfile.Profile()
         pr.enable()
         successes = 0
         numbers = 0
-        while successes <= num_instances:
-            async for instance in get_next_instance(1):
+        if replay and corpus:
+            # Replays always ingest the recorded hosts, in the order they were recorded.
+            for instance in corpus.get_hosts():
                 numbers += 1
                 print(f"Run {numbers}")
-                if await ingest_host(session, instance):
-                    successes += 1
+                await ingest_host(session, instance)
+        else:
+            await bootstrap_instances()
+            while successes <= num_instances:
+                async for instance in get_next_instance(1):
+                    numbers += 1
+                    print(f"Run {numbers}")
+                    if corpus:
+                        corpus.add_host(instance)
+                    if await ingest_host(session, instance):
+                        successes += 1
         pr.disable()
         pr.print_stats(sort=sort_by)
 
 
+@app.command()
+@syncify
+async def benchmark_ingest(corpus_path: Path, concurrency: int = typer.Option(8)):
+    """Ingests every host in a recorded corpus with no network access and reports how long it took.
+
+    Results are written to the configured database, so point DATABASE_URL at a scratch copy- the same
+    starting database is needed for runs to be comparable.
+    """
+    import time
+
+    from fedimapper.services import db_session, replay
+    from fedimapper.utils import metrics
+
+    update_tld_names()
+    corpus = replay.start_replay(corpus_path)
+    hosts = corpus.get_hosts()
+    durations = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(host: str):
+        async with slots:
+            async with db_session.get_session() as session:
+                start = time.perf_counter()
+                try:
+                    await ingest_host(session, host)
+                except Exception:
+                    pass
+                durations.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[run(host) for host in hosts])
+    total = time.perf_counter() - start
+
+    durations.sort()
+    if durations:
+        typer.echo(f"Ingested {len(hosts)} hosts in {total:.2f}s ({len(hosts) / total:.1f} hosts/s).")
+        typer.echo(f"Median {durations[len(durations) // 2]:.4f}s, p95 {durations[int(len(durations) * 0.95)]:.4f}s.")
+    for name, value in metrics.snapshot().items():
+        typer.echo(f"{name}={value:.4f}")
+
+
+async def noop_reader(session, id):
+    pass
+
+
+@app.command()
+@syncify
+async def benchmark_queue(
+    jobs: int = typer.Option(20000),
+    num_processes: int = typer.Option(2),
+    concurrency: int = typer.Option(8),
+    manager: bool = typer.Option(False, help="Use a manager proxy queue for comparison."),
+):
+    import multiprocessing as mp
+    import time
+
+    queue_settings = QueueSettings(num_processes=num_processes, concurrency=concurrency, max_jobs_per_process=None)
+    runner = QueueRunner("benchmark", reader=noop_reader, writer=get_next_instance, settings=queue_settings)
+
+    sync_manager = mp.Manager() if manager else None
+    context = sync_manager if sync_manager else runner.context
+    queue = context.Queue(queue_settings.max_queue_size)
+    shutdown_event = context.Event()
+    demand = context.Event()
+
+    processes = [runner.launch_worker(queue, shutdown_event, demand).process for i in range(num_processes)]
+    for process in processes:
+        process.start()
+
+    # Workers exit once they reach a close message, so joining them means every job has been taken.
+    start = time.perf_counter()
+    for i in range(jobs):
+        queue.put(f"host-{i}.example")
+    for process in processes:
+        queue.put("close")
+    for process in processes:
+        process.join()
+    total = time.perf_counter() - start
+
+    if sync_manager:
+        sync_manager.shutdown()
+    typer.echo(
+        f"Dispatched {jobs} jobs in {total:.2f}s: {jobs / total:.0f} jobs/s, {total / jobs * 1e6:.1f}us per job."
+    )
+
+
+async def warm_up_reader(session, id):
+    ingest.warm_up()
+
+
+@app.command()
+def benchmark_worker_start(launches: int = typer.Option(10)):
+    """Times how long it takes to replace a worker, from launch until its first job is done."""
+    import multiprocessing as mp
+    import time
+
+    from tabulate import tabulate
+
+    output = []
+    for start_method in mp.get_all_start_methods():
+        queue_settings = QueueSettings(
+            num_processes=1, start_method=start_method, preload_modules=["fedimapper.tasks.preload"]
+        )
+        runner = QueueRunner("benchmark", reader=warm_up_reader, writer=get_next_instance, settings=queue_settings)
+        queue = runner.context.Queue()
+        shutdown_event = runner.context.Event()
+        demand = runner.context.Event()
+        durations = []
+
+        # The first launch also starts the forkserver, so it is reported on its own.
+        for i in range(launches + 1):
+            worker = runner.launch_worker(queue, shutdown_event, demand)
+            start = time.perf_counter()
+            worker.process.start()
+            queue.put("warm.up.example")
+            queue.put("close")
+            worker.process.join()
+            durations.append(time.perf_counter() - start)
+
+        output.append([start_method, f"{durations[0] * 1000:.1f}", f"{sum(durations[1:]) / launches * 1000:.1f}"])
+
+    print(tabulate(output, headers=["start method", "first launch ms", "replacement ms"]))
+
+
 @app.command()
 def vacuum_database():
     sqlite_prefix = "sqlite:///"
@@ -140,6 +324,62 @@ def vacuum_database():
     conn.close()
 
 
+@app.command()
+def rebuild_asn_index(
+    prefix_files: List[Path],
+    names_file: Path = typer.Option(None),
+    output: Path = typer.Option(None),
+):
+    from fedimapper.services.asn_index import build_index
+
+    if not output:
+        if not settings.asn_index_path:
+            typer.echo("Pass an output path or set ASN_INDEX_PATH.")
+            sys.exit(1)
+        output = Path(settings.asn_index_path)
+
+    ipv4_count, ipv6_count = build_index(prefix_files, names_file, output)
+    typer.echo(f"Wrote {ipv4_count} IPv4 and {ipv6_count} IPv6 ranges to {output}.")
+
+
+@app.command()
+def benchmark_json(hosts: int = typer.Option(50000), rounds: int = typer.Option(5)):
+    import time
+
+    from tabulate import tabulate
+
+    from fedimapper.utils import codec
+
+    # Shaped like the largest responses- peer lists on ingest and host lists from the API.
+    payloads = {
+        "peers": [f"host-{i}.example.social" for i in range(hosts)],
+        "domain_blocks": [
+            {"domain": f"host-{i}.example", "digest": "0" * 64, "severity": "suspend", "comment": "spam"}
+            for i in range(hosts // 10)
+        ],
+        "software_hosts": {"software": "mastodon", "hosts": [f"host-{i}.example.social" for i in range(hosts)]},
+    }
+
+    output = []
+    for name, payload in payloads.items():
+        encoded = codec.stdlib_dumps(payload)
+        for backend, functions in codec.BACKENDS.items():
+            start = time.perf_counter()
+            for _ in range(rounds):
+                functions["loads"](encoded)
+            decode_time = (time.perf_counter() - start) / rounds
+
+            start = time.perf_counter()
+            for _ in range(rounds):
+                functions["dumps"](payload)
+            encode_time = (time.perf_counter() - start) / rounds
+
+            output.append([name, len(encoded), backend, f"{decode_time * 1000:.2f}", f"{encode_time * 1000:.2f}"])
+
+    print(f"Active backend: {codec.backend}")
+    print(tabulate(output, headers=["payload", "bytes", "backend", "decode ms", "encode ms"]))
+
+
 @app.command()
 def word_test(language="english", message="The little brown dog did stuff."):
     from fedimapper.services import stopwords
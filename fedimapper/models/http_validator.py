@@ -0,0 +1,12 @@
+from sqlalchemy import Column, DateTime, String
+
+from .base import Base
+
+
+class HttpValidator(Base):
+    __tablename__ = "http_validators"
+
+    url = Column(String, primary_key=True)
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    checked_at = Column(DateTime, nullable=False)
@@ -1,8 +1,19 @@
-from sqlalchemy import Boolean, Column, DateTime, Index, Integer, String
+import datetime
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Index, Integer, String
 from sqlalchemy.sql import func
 
 from .base import Base
 
+# Why a host is due for an ingest. Hosts that have never been ingested are due from UNSCANNED_AT, which
+# puts them ahead of everything else.
+INGEST_PRIORITY_UNSCANNED = 0
+INGEST_PRIORITY_STALE = 1
+INGEST_PRIORITY_UNREACHABLE = 2
+INGEST_PRIORITY_DORMANT = 3
+INGEST_PRIORITY_QUARANTINED = 4
+UNSCANNED_AT = datetime.datetime(1970, 1, 1)
+
 
 class Instance(Base):
     __tablename__ = "instances"
@@ -14,7 +25,20 @@ class Instance(Base):
     last_ingest_success = Column(DateTime, nullable=True)
     first_ingest_success = Column(DateTime, nullable=True)
     last_ingest_peers = Column(DateTime, nullable=True)
+    consecutive_failures = Column(Integer, nullable=False, default=0, server_default="0")
+    next_ingest_at = Column(DateTime, nullable=False, default=UNSCANNED_AT, server_default="1970-01-01 00:00:00")
+    ingest_priority = Column(Integer, nullable=False, default=INGEST_PRIORITY_UNSCANNED, server_default="0")
+    claimed_by = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    # When the host was due before it was claimed, so a claim that is handed back doesn't lose its place.
+    claimed_next_ingest_at = Column(DateTime, nullable=True)
+    crash_count = Column(Integer, nullable=False, default=0, server_default="0")
+    timeout_count = Column(Integer, nullable=False, default=0, server_default="0")
+    quarantined_until = Column(DateTime, nullable=True, index=True)
     www_host = Column(String, nullable=True)
+    www_host_checked_at = Column(DateTime, nullable=True)
+    latency_average = Column(Float, nullable=True)
+    latency_deviation = Column(Float, nullable=True)
 
     title = Column(String, nullable=True)
     short_description = Column(String, nullable=True)
@@ -37,13 +61,18 @@ class Instance(Base):
     mastodon_version = Column(String, nullable=True)
     software_version = Column(String, nullable=True)
     nodeinfo_version = Column(String, nullable=True)
+    nodeinfo_href = Column(String, nullable=True)
+    nodeinfo_schema = Column(String, nullable=True)
+    nodeinfo_checked_at = Column(DateTime, nullable=True)
 
     ip_address = Column(String, nullable=True)
+    ipv6_address = Column(String, nullable=True)
     asn = Column(String, nullable=True)
     base_domain = Column(String, index=True)
 
 
 Index("idx_instance_status_time", Instance.last_ingest_status, Instance.last_ingest)
+Index("idx_instance_next_ingest", Instance.next_ingest_at, Instance.ingest_priority)
 
 
 class InstanceStats(Base):
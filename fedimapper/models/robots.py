@@ -0,0 +1,13 @@
+from sqlalchemy import Column, DateTime, Float, Integer, String
+
+from .base import Base
+
+
+class RobotsTxt(Base):
+    __tablename__ = "robots"
+
+    base_url = Column(String, primary_key=True)
+    status_code = Column(Integer, nullable=False)
+    rules = Column(String, nullable=True)
+    crawl_delay = Column(Float, nullable=True)
+    fetched_at = Column(DateTime, nullable=False)
@@ -6,6 +6,7 @@ from starlette.background import BackgroundTask
 from starlette.responses import JSONResponse
 
 from fedimapper.settings import settings
+from fedimapper.utils import codec
 
 
 class CachedJSONResponse(JSONResponse):
@@ -34,3 +35,6 @@ class CachedJSONResponse(JSONResponse):
             expires_datetime = datetime.now() + timedelta(seconds=expires_ttl)
             expires_timestamp = int(round(expires_datetime.timestamp()))
             self.headers["Expires"] = format_date_time(expires_timestamp)
+
+    def render(self, content: typing.Any) -> bytes:
+        return codec.dumps(content)
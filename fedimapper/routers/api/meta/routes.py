@@ -4,13 +4,16 @@ from logging import getLogger
 from fastapi import APIRouter, Depends
 from sqlalchemy import and_, desc, func, select
 
-from fedimapper.models.instance import Instance
-from fedimapper.run import get_stale, get_unreachable
+from fedimapper.models.instance import (
+    INGEST_PRIORITY_STALE,
+    INGEST_PRIORITY_UNREACHABLE,
+    Instance,
+)
+from fedimapper.run import get_oldest_due
 from fedimapper.services.db import AsyncSession
 from fedimapper.services.db_session import get_session_depends
-from fedimapper.settings import UNREADABLE_STATUSES, settings
 
-from .schemas.models import MetaData
+from .schemas.models import MetaData, QuarantinedHost, QuarantineList
 
 router = APIRouter()
 logger = getLogger(__name__)
@@ -18,24 +21,22 @@ logger = getLogger(__name__)
 
 async def get_oldest_stale_lag(db: AsyncSession = Depends(get_session_depends)):
     try:
-        oldest_stale = (await get_stale(db, 1)).first()[0]
+        oldest_stale = await get_oldest_due(db, INGEST_PRIORITY_STALE)
         if oldest_stale:
-            stale_window = datetime.datetime.utcnow() - datetime.timedelta(hours=settings.stale_rescan_hours)
-            return (stale_window - oldest_stale.last_ingest).total_seconds()
+            return (datetime.datetime.utcnow() - oldest_stale.next_ingest_at).total_seconds()
     except:
         return 0
+    return 0
 
 
 async def get_oldest_unreachable_lag(db: AsyncSession = Depends(get_session_depends)):
     try:
-        oldest_unreachable = (await get_unreachable(db, 1)).first()[0]
+        oldest_unreachable = await get_oldest_due(db, INGEST_PRIORITY_UNREACHABLE)
         if oldest_unreachable:
-            unreachable_window = datetime.datetime.utcnow() - datetime.timedelta(
-                hours=settings.unreachable_rescan_hours
-            )
-            return (unreachable_window - oldest_unreachable.last_ingest).total_seconds()
+            return (datetime.datetime.utcnow() - oldest_unreachable.next_ingest_at).total_seconds()
     except:
         return 0
+    return 0
 
 
 async def get_last_ingest(db: AsyncSession = Depends(get_session_depends)):
@@ -81,3 +82,14 @@ async def get_meta(db: AsyncSession = Depends(get_session_depends)) -> MetaData:
         last_ingest=await get_last_ingest(db),
         sps=await get_sps(db),
     )
+
+
+@router.get("/quarantined", response_model=QuarantineList)
+async def get_quarantined(db: AsyncSession = Depends(get_session_depends)) -> QuarantineList:
+    select_stmt = (
+        select(Instance)
+        .where(Instance.quarantined_until > datetime.datetime.utcnow())
+        .order_by(Instance.quarantined_until.desc())
+    )
+    hosts = (await db.execute(select_stmt)).scalars()
+    return QuarantineList(hosts=[QuarantinedHost.from_orm(host) for host in hosts])
@@ -1,5 +1,7 @@
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List
+
+from pydantic import BaseModel
 
 from fedimapper.routers.api.common.schemas.base import ResponseBase
 
@@ -11,3 +13,19 @@ class MetaData(ResponseBase):
     scanned: int
     last_ingest: datetime | None = None
     sps: float
+
+
+class QuarantinedHost(BaseModel):
+    host: str
+    crash_count: int
+    timeout_count: int
+    quarantined_until: datetime
+    last_ingest: datetime | None = None
+    last_ingest_status: str | None = None
+
+    class Config:
+        orm_mode = True
+
+
+class QuarantineList(ResponseBase):
+    hosts: List[QuarantinedHost]
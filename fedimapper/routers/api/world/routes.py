@@ -5,7 +5,6 @@ from fastapi import APIRouter, Depends
 from sqlalchemy import Column, and_, desc, distinct, func, select
 
 from fedimapper.models.instance import Instance
-from fedimapper.run import get_stale, get_unreachable
 from fedimapper.services.db import AsyncSession
 from fedimapper.services.db_session import get_session_depends
 from fedimapper.settings import UNREADABLE_STATUSES, settings
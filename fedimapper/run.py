@@ -1,17 +1,24 @@
 import datetime
 import logging
-from typing import AsyncIterator
+import os
+import socket
+from typing import AsyncIterator, Dict, List
 
-from sqlalchemy import and_, or_, select
+from sqlalchemy import and_, case, func, select, update
 from sqlalchemy.dialects.sqlite import insert
 
-from fedimapper.models.instance import Instance
+from fedimapper.models.instance import UNSCANNED_AT, Instance
 
-from .services import db, db_session
-from .settings import UNREADABLE_STATUSES, settings
+from .services import db, db_session, politeness
+from .settings import settings
+from .tasks import quarantine
+from .utils import metrics
 
 logger = logging.getLogger(__name__)
 
+# Identifies the hosts this crawler has claimed, so several crawlers can share one database.
+NODE_ID = settings.crawler_node_id or f"{socket.gethostname()}-{os.getpid()}"
+
 
 async def bootstrap(session):
     insert_instance_values = [{"host": host} for host in settings.bootstrap_instances]
@@ -22,52 +29,122 @@ async def bootstrap(session):
     await session.commit()
 
 
-async def get_unscanned(session, desired: int):
-    select_stmt = select(Instance).where(Instance.last_ingest == None).limit(desired)
-    return await session.execute(select_stmt)
+async def bootstrap_instances():
+    async with db_session.get_session() as session:
+        await bootstrap(session)
+
+
+async def claim_due(session, desired: int):
+    """Claims a batch of due hosts for this crawler and returns them.
 
+    Every host carries the time its next ingest is due, so finding them is a single range scan over one
+    index. Claiming a host moves its due time to the end of the lease, so other crawlers stop seeing it
+    and it comes due again by itself if this crawler dies before ingesting it. The old due time is kept
+    so it can be put back if the claim is released unused. On Postgres the rows are
+    locked while they're claimed, and rows another crawler has locked are skipped rather than waited on.
 
-async def get_stale(session, desired: int):
-    stale_scan = datetime.datetime.utcnow() - datetime.timedelta(hours=settings.stale_rescan_hours)
+    Hosts that are due again while still claimed were being ingested by a worker that died or hung, so
+    that is counted against them, and the ones this puts into quarantine are left out of the batch.
+    """
+    now = datetime.datetime.utcnow()
     select_stmt = (
-        select(Instance)
-        .where(and_(Instance.last_ingest < stale_scan, Instance.last_ingest_status.not_in(UNREADABLE_STATUSES)))
-        .order_by(Instance.last_ingest.asc())
+        select(
+            Instance.host,
+            Instance.ip_address,
+            Instance.ipv6_address,
+            Instance.asn,
+            Instance.claimed_by,
+            Instance.lease_expires_at,
+            Instance.last_ingest,
+        )
+        .where(Instance.next_ingest_at <= now)
+        .order_by(Instance.next_ingest_at.asc(), Instance.ingest_priority.asc())
         .limit(desired)
+        .with_for_update(skip_locked=True)
+    )
+    rows = (await session.execute(select_stmt)).all()
+    abandoned = [
+        row.host for row in rows if quarantine.was_abandoned(row.claimed_by, row.lease_expires_at, row.last_ingest)
+    ]
+    if abandoned:
+        quarantined = await quarantine.record_abandoned(session, abandoned)
+        rows = [row for row in rows if row.host not in quarantined]
+    if rows:
+        lease_expires_at = now + datetime.timedelta(seconds=settings.ingest_lease_seconds)
+        claim_stmt = (
+            update(Instance)
+            .where(Instance.host.in_([row.host for row in rows]))
+            .values(
+                claimed_by=NODE_ID,
+                lease_expires_at=lease_expires_at,
+                claimed_next_ingest_at=Instance.next_ingest_at,
+                next_ingest_at=lease_expires_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await session.execute(claim_stmt)
+    await session.commit()
+    metrics.increment("scheduler.claimed", len(rows))
+    return rows
+
+
+async def release_claims(hosts: List[str] | None = None, delays: Dict[str, float] | None = None):
+    """Hands back hosts this crawler claimed but won't ingest, putting them back to when they were due.
+
+    Hosts the politeness limiter is holding back are given `delays`, the seconds until their origins have
+    room again, and aren't due until then. Without a list of hosts every claim this crawler still holds
+    is released, which is done on shutdown.
+    """
+    conditions = [Instance.claimed_by == NODE_ID]
+    if hosts is not None:
+        conditions.append(Instance.host.in_(hosts))
+    next_ingest_at = func.coalesce(Instance.claimed_next_ingest_at, Instance.next_ingest_at)
+    if delays:
+        now = datetime.datetime.utcnow()
+        deferred_until = {host: now + datetime.timedelta(seconds=delay) for host, delay in delays.items() if delay > 0}
+        if deferred_until:
+            next_ingest_at = case(deferred_until, value=Instance.host, else_=next_ingest_at)
+    release_stmt = (
+        update(Instance)
+        .where(and_(*conditions))
+        .values(claimed_by=None, lease_expires_at=None, claimed_next_ingest_at=None, next_ingest_at=next_ingest_at)
+        .execution_options(synchronize_session=False)
     )
-    return await session.execute(select_stmt)
+    async with db_session.get_session() as session:
+        await session.execute(release_stmt)
+        await session.commit()
 
 
-async def get_unreachable(session, desired: int):
-    stale_scan = datetime.datetime.utcnow() - datetime.timedelta(hours=settings.unreachable_rescan_hours)
+async def get_backlog_age() -> float:
+    """Returns how overdue the most overdue host is, in seconds.
+
+    Hosts that have never been scanned have no real due time, so they're left out.
+    """
+    now = datetime.datetime.utcnow()
+    select_stmt = select(func.min(Instance.next_ingest_at)).where(
+        and_(Instance.next_ingest_at > UNSCANNED_AT, Instance.next_ingest_at <= now)
+    )
+    async with db_session.get_session() as session:
+        oldest = (await session.execute(select_stmt)).scalar()
+    return (now - oldest).total_seconds() if oldest else 0.0
+
+
+async def get_oldest_due(session, priority: int):
     select_stmt = (
         select(Instance)
-        .where(
-            and_(
-                Instance.last_ingest < stale_scan,
-                or_(Instance.last_ingest_status.in_(UNREADABLE_STATUSES), Instance.last_ingest_status == None),
-            )
-        )
-        .order_by(Instance.last_ingest.asc())
-        .limit(desired)
+        .where(and_(Instance.next_ingest_at <= datetime.datetime.utcnow(), Instance.ingest_priority == priority))
+        .order_by(Instance.next_ingest_at.asc())
+        .limit(1)
     )
-    return await session.execute(select_stmt)
+    return (await session.execute(select_stmt)).scalars().first()
 
 
 async def get_next_instance(desired: int = 1) -> AsyncIterator[str]:
-
     async with db_session.get_session() as session:
-        await bootstrap(session)
-        for lookup in [get_unscanned, get_stale, get_unreachable]:
-            results = await lookup(session, desired)
-            for row in results:
-                desired -= 1
-                instance = row[0]
-                yield instance.host
-            results.close()
-            if desired <= 0:
-                break
-
-    # Start with our bootstrap instances to ensure we have something to work with.
+        for row in await claim_due(session, desired):
+            desired -= 1
+            politeness.origin_limiter.remember(row.host, row.ip_address or row.ipv6_address, row.asn)
+            yield row.host
+
     if desired > 0:
         logger.debug("All instances have been crawled- nothing available.")
@@ -0,0 +1,266 @@
+import gzip
+import ipaddress
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_right
+from logging import getLogger
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Literal, NamedTuple, Tuple
+
+from fedimapper.settings import settings
+
+from .asn_lookup import ASNRecord
+
+logger = getLogger(__name__)
+
+# The index is a flat file of sorted, non-overlapping address ranges. Nested prefixes are split when the
+# index is built so each range belongs to the most specific prefix covering it, which turns a longest
+# prefix match into a single binary search. Every array is read straight out of a read only memory map,
+# so all processes on a host share one copy through the page cache.
+#
+# IPv6 ranges are keyed on the upper 64 bits of the address. Routes longer than a /64 are not globally
+# announced, so nothing is lost by ignoring them.
+#
+# Layout (arrays use the byte order of the machine that built the index):
+#   header        magic, version, ipv4 count, ipv6 count, asn count, names size (little endian)
+#   uint64[]      ipv6 range starts, ipv6 range ends
+#   uint32[]      ipv4 range starts, ipv4 range ends, ipv4 asns, ipv6 asns, sorted asns, name offsets
+#   uint8[]       ipv4 prefix lengths, ipv6 prefix lengths
+#   bytes         utf-8 owner names, indexed by the name offsets
+
+MAGIC = b"FMASNIDX"
+VERSION = 1
+HEADER = struct.Struct("<8sHxxIIII")
+HEADER_SIZE = 32
+
+
+class Prefix(NamedTuple):
+    start: int
+    end: int
+    asn: int
+    length: int
+
+
+class ASNIndexException(Exception):
+    pass
+
+
+class ASNIndex:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as fp:
+            self.mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, ipv4_count, ipv6_count, asn_count, names_size = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ASNIndexException(f"{self.path} is not a version {VERSION} ASN index.")
+
+        view = memoryview(self.mmap)
+        offset = HEADER_SIZE
+
+        def section(count: int, typecode: Literal["B", "I", "Q"]) -> memoryview:
+            nonlocal offset
+            size = count * struct.calcsize(typecode)
+            values = view[offset : offset + size].cast(typecode)
+            offset += size
+            return values
+
+        self.ipv6_starts = section(ipv6_count, "Q")
+        self.ipv6_ends = section(ipv6_count, "Q")
+        self.ipv4_starts = section(ipv4_count, "I")
+        self.ipv4_ends = section(ipv4_count, "I")
+        self.ipv4_asns = section(ipv4_count, "I")
+        self.ipv6_asns = section(ipv6_count, "I")
+        self.asn_keys = section(asn_count, "I")
+        self.name_offsets = section(asn_count + 1, "I")
+        self.ipv4_lengths = section(ipv4_count, "B")
+        self.ipv6_lengths = section(ipv6_count, "B")
+        self.names = view[offset : offset + names_size]
+
+    def lookup(self, ip: str) -> ASNRecord | None:
+        address = ipaddress.ip_address(ip)
+        if address.version == 4:
+            key = int(address)
+            starts, ends, asns, lengths = self.ipv4_starts, self.ipv4_ends, self.ipv4_asns, self.ipv4_lengths
+        else:
+            key = int(address) >> 64
+            starts, ends, asns, lengths = self.ipv6_starts, self.ipv6_ends, self.ipv6_asns, self.ipv6_lengths
+
+        position = bisect_right(starts, key) - 1
+        if position < 0 or key > ends[position]:
+            return None
+
+        asn = asns[position]
+        prefix = ipaddress.ip_network((address, lengths[position]), strict=False)
+        owner = self.get_owner(asn)
+        cc = owner[-2:] if owner and len(owner) > 4 and owner[-4:-2] == ", " else None
+        return ASNRecord(asn=str(asn), prefix=str(prefix), cc=cc, owner=owner)
+
+    def get_owner(self, asn: int) -> str | None:
+        position = bisect_right(self.asn_keys, asn) - 1
+        if position < 0 or self.asn_keys[position] != asn:
+            return None
+        start = self.name_offsets[position]
+        end = self.name_offsets[position + 1]
+        return bytes(self.names[start:end]).decode("utf-8")
+
+
+_index: ASNIndex | None = None
+
+
+def get_index() -> ASNIndex | None:
+    global _index
+    if not settings.asn_index_path:
+        return None
+    if not _index:
+        _index = ASNIndex(settings.asn_index_path)
+    return _index
+
+
+def open_text(path: Path) -> Iterator[str]:
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8", errors="replace") as fp:  # type: ignore
+        yield from fp
+
+
+def read_prefixes(lines: Iterable[str]) -> Tuple[List[Prefix], List[Prefix]]:
+    """Parses routeviews pfx2as style lines (`network<tab>length<tab>asn`).
+
+    Multi origin (`13335_4826`) and AS set (`13335,4826`) entries are attributed to their first ASN.
+
+    Args:
+        lines (Iterable[str]): Lines from one or more prefix dump files.
+
+    Returns:
+        Tuple[List[Prefix], List[Prefix]]: The IPv4 and IPv6 prefixes.
+    """
+    ipv4: List[Prefix] = []
+    ipv6: List[Prefix] = []
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 3 or parts[0].startswith("#"):
+            continue
+        try:
+            network = ipaddress.ip_network(f"{parts[0]}/{parts[1]}", strict=False)
+            asn = int(parts[2].replace(",", "_").split("_")[0])
+        except ValueError:
+            continue
+
+        if network.version == 4:
+            ipv4.append(Prefix(int(network.network_address), int(network.broadcast_address), asn, network.prefixlen))
+        elif network.prefixlen <= 64:
+            start = int(network.network_address) >> 64
+            ipv6.append(Prefix(start, int(network.broadcast_address) >> 64, asn, network.prefixlen))
+    return ipv4, ipv6
+
+
+def read_names(lines: Iterable[str]) -> Dict[int, str]:
+    """Parses AS name lines (`13335 CLOUDFLARENET, US`), matching the owner strings whois returns.
+
+    Args:
+        lines (Iterable[str]): Lines from an AS names file.
+
+    Returns:
+        Dict[int, str]: Owner strings keyed by ASN.
+    """
+    names = {}
+    for line in lines:
+        parts = line.strip().split(" ", 1)
+        if len(parts) < 2:
+            continue
+        try:
+            names[int(parts[0].upper().removeprefix("AS"))] = parts[1].strip()
+        except ValueError:
+            continue
+    return names
+
+
+def flatten(prefixes: List[Prefix]) -> List[Prefix]:
+    """Splits nested prefixes into non-overlapping ranges, each owned by its most specific prefix.
+
+    Args:
+        prefixes (List[Prefix]): Prefixes in any order.
+
+    Returns:
+        List[Prefix]: Sorted ranges that no longer overlap.
+    """
+    ranges: List[Prefix] = []
+
+    def emit(start: int, end: int, owner: Prefix):
+        if start <= end:
+            ranges.append(Prefix(start, end, owner.asn, owner.length))
+
+    # Sorting on start then length puts every prefix directly after the prefixes that contain it.
+    open_prefixes: List[Prefix] = []
+    cursor = 0
+    for prefix in sorted(prefixes, key=lambda x: (x.start, x.length)):
+        while open_prefixes and open_prefixes[-1].end < prefix.start:
+            closed = open_prefixes.pop()
+            emit(cursor, closed.end, closed)
+            cursor = max(cursor, closed.end + 1)
+        if open_prefixes:
+            emit(cursor, prefix.start - 1, open_prefixes[-1])
+        cursor = max(cursor, prefix.start)
+        open_prefixes.append(prefix)
+
+    while open_prefixes:
+        closed = open_prefixes.pop()
+        emit(cursor, closed.end, closed)
+        cursor = max(cursor, closed.end + 1)
+
+    return ranges
+
+
+def build_index(prefix_files: List[Path], names_file: Path | None, output: Path) -> Tuple[int, int]:
+    """Builds an index file from prefix dumps and an optional AS names file.
+
+    The new index is written next to the old one and moved into place, so running workers keep their
+    existing mapping until they next open the index.
+
+    Args:
+        prefix_files (List[Path]): pfx2as style dumps, optionally gzipped.
+        names_file (Path | None): AS names used to fill in owner and country data.
+        output (Path): Where to write the index.
+
+    Returns:
+        Tuple[int, int]: The number of IPv4 and IPv6 ranges in the index.
+    """
+    ipv4_prefixes: List[Prefix] = []
+    ipv6_prefixes: List[Prefix] = []
+    for prefix_file in prefix_files:
+        ipv4, ipv6 = read_prefixes(open_text(prefix_file))
+        ipv4_prefixes.extend(ipv4)
+        ipv6_prefixes.extend(ipv6)
+
+    ipv4_ranges = flatten(ipv4_prefixes)
+    ipv6_ranges = flatten(ipv6_prefixes)
+
+    names = read_names(open_text(names_file)) if names_file else {}
+    asn_keys = sorted(names.keys())
+    name_blob = bytearray()
+    name_offsets = array("I")
+    for asn in asn_keys:
+        name_offsets.append(len(name_blob))
+        name_blob.extend(names[asn].encode("utf-8"))
+    name_offsets.append(len(name_blob))
+
+    temp_output = output.with_name(f"{output.name}.{os.getpid()}.tmp")
+    with open(temp_output, "wb") as fp:
+        header = HEADER.pack(MAGIC, VERSION, len(ipv4_ranges), len(ipv6_ranges), len(asn_keys), len(name_blob))
+        fp.write(header.ljust(HEADER_SIZE, b"\0"))
+        array("Q", [x.start for x in ipv6_ranges]).tofile(fp)
+        array("Q", [x.end for x in ipv6_ranges]).tofile(fp)
+        array("I", [x.start for x in ipv4_ranges]).tofile(fp)
+        array("I", [x.end for x in ipv4_ranges]).tofile(fp)
+        array("I", [x.asn for x in ipv4_ranges]).tofile(fp)
+        array("I", [x.asn for x in ipv6_ranges]).tofile(fp)
+        array("I", asn_keys).tofile(fp)
+        name_offsets.tofile(fp)
+        array("B", [x.length for x in ipv4_ranges]).tofile(fp)
+        array("B", [x.length for x in ipv6_ranges]).tofile(fp)
+        fp.write(name_blob)
+    os.replace(temp_output, output)
+
+    return len(ipv4_ranges), len(ipv6_ranges)
@@ -0,0 +1,170 @@
+import asyncio
+import ipaddress
+import time
+from logging import getLogger
+from typing import Dict, List, Set
+
+import cymruwhois
+from cachetools import LRUCache, TTLCache
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fedimapper.models.asn import ASN
+from fedimapper.services import www
+from fedimapper.settings import settings
+from fedimapper.utils import metrics
+
+logger = getLogger(__name__)
+
+
+class ASNRecord(BaseModel):
+    asn: str
+    prefix: str
+    cc: str | None = None
+    owner: str | None = None
+
+
+# Announced prefixes mapped to the record that was returned for them. Any address inside one of these
+# prefixes is answered locally, longest prefix first.
+prefix_cache: LRUCache = LRUCache(maxsize=settings.cache_size_asn_prefixes)
+prefix_lengths: Dict[int, Set[int]] = {4: set(), 6: set()}
+
+# Addresses that whois had no answer for.
+unannounced_cache: TTLCache = TTLCache(maxsize=settings.cache_size_asn_prefixes, ttl=settings.asn_unannounced_ttl)
+
+# Addresses waiting for the next bulk lookup, along with the futures their callers are awaiting.
+pending_lookups: Dict[str, asyncio.Future] = {}
+flush_handle: asyncio.TimerHandle | None = None
+flush_tasks: Set[asyncio.Task] = set()
+
+known_prefixes_loaded = False
+
+
+def add_to_cache(record: ASNRecord) -> None:
+    try:
+        network = ipaddress.ip_network(record.prefix, strict=False)
+    except ValueError:
+        return
+    prefix_cache[network] = record
+    prefix_lengths[network.version].add(network.prefixlen)
+
+
+def get_cached(ip: str) -> ASNRecord | None:
+    address = ipaddress.ip_address(ip)
+    for length in sorted(prefix_lengths[address.version], reverse=True):
+        network = ipaddress.ip_network((address, length), strict=False)
+        if network in prefix_cache:
+            return prefix_cache[network]
+    return None
+
+
+async def load_known_prefixes(session: AsyncSession) -> None:
+    """Seeds the prefix cache with every network already saved in the ASN table.
+
+    Args:
+        session (AsyncSession): Session used to read the ASN table.
+    """
+    global known_prefixes_loaded
+    if known_prefixes_loaded:
+        return
+
+    results = await session.execute(select(ASN.asn, ASN.prefix, ASN.cc, ASN.owner).where(ASN.prefix != None))
+    for row in results:
+        add_to_cache(ASNRecord(asn=row.asn, prefix=row.prefix, cc=row.cc, owner=row.owner))
+    known_prefixes_loaded = True
+
+
+async def get_asn_data(ip: str) -> ASNRecord | None:
+    ip = str(ipaddress.ip_address(ip))
+    metrics.increment("asn.lookups")
+    start = time.perf_counter()
+    try:
+        record = get_cached(ip)
+        if record:
+            metrics.increment("asn.cache.hits")
+            return record
+
+        if ip in unannounced_cache:
+            metrics.increment("asn.cache.hits")
+            return None
+
+        return await asyncio.shield(queue_lookup(ip))
+    finally:
+        metrics.set_gauge("asn.cache.hit_rate", metrics.ratio("asn.cache.hits", "asn.lookups"))
+        metrics.observe("asn.lookup.seconds", time.perf_counter() - start)
+
+
+def queue_lookup(ip: str) -> asyncio.Future:
+    global flush_handle
+    if ip in pending_lookups:
+        return pending_lookups[ip]
+
+    loop = asyncio.get_running_loop()
+    pending_lookups[ip] = loop.create_future()
+
+    # Wait briefly so lookups from other ingests in this process can join the same bulk request. When
+    # this is the only ingest running nothing else can join, so the lookup goes out straight away.
+    if len(pending_lookups) >= settings.asn_lookup_batch_size or www.active_sessions <= 1:
+        if flush_handle:
+            flush_handle.cancel()
+        start_flush()
+    elif not flush_handle:
+        flush_handle = loop.call_later(settings.asn_lookup_batch_wait, start_flush)
+
+    return pending_lookups[ip]
+
+
+def start_flush() -> None:
+    global flush_handle
+    flush_handle = None
+    task = asyncio.get_running_loop().create_task(flush_lookups())
+    flush_tasks.add(task)
+    task.add_done_callback(flush_tasks.discard)
+
+
+async def flush_lookups() -> None:
+    global pending_lookups
+    batch = pending_lookups
+    pending_lookups = {}
+    if len(batch) < 1:
+        return
+
+    metrics.increment("asn.whois.requests")
+    metrics.increment("asn.whois.addresses", len(batch))
+    try:
+        with metrics.timed("asn.whois.seconds"):
+            records = await asyncio.to_thread(lookupmany, list(batch.keys()))
+    except Exception as exc:
+        logger.exception("Unable to look up ASN data from whois.")
+        for future in batch.values():
+            if not future.done():
+                future.set_exception(exc)
+        return
+
+    record: ASNRecord | None
+    for record in records.values():
+        add_to_cache(record)
+
+    for ip, future in batch.items():
+        record = records.get(ip, None) or get_cached(ip)
+        if not record:
+            unannounced_cache[ip] = True
+        if not future.done():
+            future.set_result(record)
+
+
+def lookupmany(ips: List[str]) -> Dict[str, ASNRecord]:
+    client = cymruwhois.Client()
+    results = {}
+    try:
+        for record in client.lookupmany(ips):
+            # Unannounced space comes back with "NA" in place of the network details.
+            if not record.asn or record.asn == "NA" or not record.prefix or record.prefix == "NA":
+                continue
+            results[str(ipaddress.ip_address(record.ip))] = ASNRecord(
+                asn=record.asn, prefix=record.prefix, cc=record.cc, owner=record.owner
+            )
+    finally:
+        client.disconnect()
+    return results
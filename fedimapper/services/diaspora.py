@@ -4,10 +4,10 @@ from typing import Any, Dict, Set
 from .www import get_json
 
 
-def get_peers(host: str) -> Set[str] | bool:
+async def get_peers(host: str) -> Set[str] | bool:
 
     try:
-        peers = get_json(f"https://{host}/pods.json")
+        peers = await get_json(f"https://{host}/pods.json")
     except:
         return False
 
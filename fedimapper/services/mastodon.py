@@ -1,20 +1,47 @@
 import re
+from typing import Any, AsyncIterator, List
 
 from pydantic import BaseModel
 
-from .www import get_json
+from fedimapper.settings import settings
 
+from .www import get_json, prefetch, stream_json_array
 
-def get_metadata(host):
-    return get_json(f"https://{host}/api/v1/instance")
 
+async def get_metadata(host, conditional: bool = False):
+    return await get_json(f"https://{host}/api/v1/instance", conditional=conditional)
 
-def get_peers(host):
-    return get_json(f"https://{host}/api/v1/instance/peers")
 
+async def get_peers(host, conditional: bool = False):
+    return await get_json(f"https://{host}/api/v1/instance/peers", conditional=conditional)
 
-def get_blocked_instances(host):
-    return get_json(f"https://{host}/api/v1/instance/domain_blocks")
+
+async def get_blocked_instances(host, conditional: bool = False):
+    return await get_json(f"https://{host}/api/v1/instance/domain_blocks", conditional=conditional)
+
+
+def prefetch_metadata(host, conditional: bool = False) -> None:
+    prefetch(f"https://{host}/api/v1/instance", conditional=conditional)
+
+
+def prefetch_blocked_instances(host, conditional: bool = False) -> None:
+    url = f"https://{host}/api/v1/instance/domain_blocks"
+    prefetch(url, settings.peers_max_bytes, settings.peers_max_request_time, conditional)
+
+
+def prefetch_peers(host, conditional: bool = False) -> None:
+    url = f"https://{host}/api/v1/instance/peers"
+    prefetch(url, settings.peers_max_bytes, settings.peers_max_request_time, conditional)
+
+
+def stream_peers(host, conditional: bool = False) -> AsyncIterator[List[str]]:
+    url = f"https://{host}/api/v1/instance/peers"
+    return stream_json_array(url, settings.peers_max_bytes, settings.peers_max_request_time, conditional)
+
+
+def stream_blocked_instances(host, conditional: bool = False) -> AsyncIterator[List[Any]]:
+    url = f"https://{host}/api/v1/instance/domain_blocks"
+    return stream_json_array(url, settings.peers_max_bytes, settings.peers_max_request_time, conditional)
 
 
 class FediVersion(BaseModel):
@@ -1,38 +1,49 @@
 import re
-import socket
 from typing import Literal, Tuple
 
-import cymruwhois
 import httpx
 
-from .www import SafetyException, get_safe
+from fedimapper.settings import settings
+from fedimapper.utils import metrics
 
+from .asn_index import get_index
+from .asn_lookup import ASNRecord
+from .asn_lookup import get_asn_data as lookup_asn_data
+from .resolver import resolve_host
+from .www import SafetyException, get_partial
 
-def get_ip_from_url(url: str) -> str | bool:
-    try:
-        return socket.gethostbyname(url)
-    except:
-        return False
+
+async def get_ip_from_url(url: str) -> str | bool:
+    addresses = await resolve_host(url)
+    return addresses.address or False
 
 
-def get_asn_data(ip) -> cymruwhois.asrecord:
-    client = cymruwhois.Client()
-    return client.lookup(ip)
+async def get_asn_data(ip) -> ASNRecord | None:
+    # When an offline index is configured whois is never contacted.
+    index = get_index()
+    if index:
+        metrics.increment("asn.index.lookups")
+        return index.lookup(ip)
+    return await lookup_asn_data(ip)
 
 
-def can_access_https(host) -> Tuple[Literal[False] | httpx.Response, str | None]:
+async def can_access_https(host) -> Tuple[Literal[False] | httpx.Response, str | None]:
     try:
         # Ignore Robots.txt on this call due to a chicken/egg problem- we need to know
         # if the HTTPS service is accessible before we can pull files from it, and the
         # robots.txt file can't be pulled without access to the service itself.
-        response, content = get_safe(f"https://{host}", validate_robots=False, timeout=1.0)
+        # Only the start of the page is needed to spot parked domains.
+        response, content = await get_partial(
+            f"https://{host}", settings.reachability_probe_bytes, validate_robots=False, timeout=1.0
+        )
 
         # Return "unreachable" for specific status codes.
         if 500 <= response.status_code <= 520 or response.status_code == 404:
             return False, None
 
         if content and len(content) > 0:
-            return response, content.decode("utf-8")
+            # The probe can stop partway through a multibyte character.
+            return response, content.decode("utf-8", errors="ignore")
         return response, ""
 
     except (httpx.TransportError, SafetyException) as exc:
@@ -75,7 +86,10 @@ COMPANY_STARTSWITH = [
 ]
 
 
-def clean_asn_company(company: str) -> str:
+def clean_asn_company(company: str | None) -> str | None:
+    # The offline index has no owner for ASNs missing from its names file.
+    if not company:
+        return None
 
     for prefix in COMPANY_STARTSWITH:
         if company.startswith(prefix):
@@ -48,11 +48,35 @@ class NodeInfoInstance(BaseModel):
     metadata: Dict[Any, Any] = {}
 
 
+class NodeInfoLink(BaseModel):
+    href: str
+    schema_version: str | None = None
+
+
 async def get_nodeinfo(host: str) -> NodeInfoInstance | None:
+    link = await get_nodeinfo_link(host)
+    if not link:
+        return None
+    return await get_nodeinfo_document(host, link.href)
+
+
+async def get_nodeinfo_link(host: str) -> NodeInfoLink | None:
+    try:
+        reference = await get_json(f"https://{host}/.well-known/nodeinfo")
+        link = reference.get("links", []).pop()
+        href = link.get("href", None)
+        if not href:
+            return None
+        # Schema relations look like `http://nodeinfo.diaspora.software/ns/schema/2.0`.
+        rel = link.get("rel", None)
+        return NodeInfoLink(href=href, schema_version=rel.rstrip("/").split("/")[-1] if rel else None)
+    except:
+        return None
+
+
+async def get_nodeinfo_document(host: str, href: str) -> NodeInfoInstance | None:
     try:
-        reference = get_json(f"https://{host}/.well-known/nodeinfo")
-        nodeinfo_url = reference.get("links", []).pop().get("href", None)
-        nodeinfo = get_json(nodeinfo_url)
+        nodeinfo = await get_json(href)
     except:
         return None
 
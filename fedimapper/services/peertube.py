@@ -1,21 +1,21 @@
 from .www import get_json
 
 
-def get_metadata(host):
-    return get_json(f"https://{host}/api/v1/config")
+async def get_metadata(host, conditional: bool = False):
+    return await get_json(f"https://{host}/api/v1/config", conditional=conditional)
 
 
-def get_about(host):
-    return get_json(f"https://{host}/api/v1/config/about")
+async def get_about(host):
+    return await get_json(f"https://{host}/api/v1/config/about")
 
 
-def get_custom_settings(host):
-    return get_json(f"https://{host}/api/v1/config/custom")
+async def get_custom_settings(host):
+    return await get_json(f"https://{host}/api/v1/config/custom")
 
 
-def get_stats(host):
-    return get_json(f"https://{host}/api/v1/server/stats")
+async def get_stats(host):
+    return await get_json(f"https://{host}/api/v1/server/stats")
 
 
-def get_peers(host):
-    return get_json(f"https://{host}/api/v1/server/followers")
+async def get_peers(host, conditional: bool = False):
+    return await get_json(f"https://{host}/api/v1/server/followers", conditional=conditional)
@@ -0,0 +1,92 @@
+import time
+from typing import List, Tuple
+
+from cachetools import LRUCache
+
+from fedimapper.settings import settings
+from fedimapper.utils import metrics
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now: float) -> bool:
+        self.refill(now)
+        return self.tokens >= 1
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+    def get_wait(self, now: float) -> float:
+        self.refill(now)
+        if self.tokens >= 1 or self.rate <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class OriginLimiter:
+    """Limits how quickly hosts sharing an IP address or network are handed out to workers.
+
+    Every host is dispatched by the queue builder in the parent process, so a single limiter there
+    covers all of the workers.
+    """
+
+    def __init__(self, ip_rate: float, ip_burst: float, asn_rate: float, asn_burst: float):
+        self.limits = {"ip": (ip_rate, ip_burst), "asn": (asn_rate, asn_burst)}
+        self.buckets: LRUCache = LRUCache(maxsize=settings.cache_size_politeness)
+        self.origins: LRUCache = LRUCache(maxsize=settings.cache_size_politeness)
+
+    def remember(self, host: str, ip_address: str | None, asn: str | None) -> None:
+        self.origins[host] = (ip_address, asn)
+
+    def get_keys(self, host: str) -> List[Tuple[str, str]]:
+        ip_address, asn = self.origins.get(host, (None, None))
+        keys = []
+        if ip_address:
+            keys.append(("ip", ip_address))
+        if asn:
+            keys.append(("asn", asn))
+        return keys
+
+    def get_bucket(self, kind: str, value: str, now: float) -> TokenBucket:
+        key = f"{kind}:{value}"
+        if key not in self.buckets:
+            rate, burst = self.limits[kind]
+            self.buckets[key] = TokenBucket(rate, burst, now)
+        return self.buckets[key]
+
+    def acquire(self, host: str, now: float | None = None) -> bool:
+        now = now if now is not None else time.monotonic()
+        buckets = [self.get_bucket(kind, value, now) for kind, value in self.get_keys(host)]
+
+        # Tokens are only taken when every origin the host belongs to has room.
+        if not all([bucket.available(now) for bucket in buckets]):
+            metrics.increment("politeness.deferred")
+            return False
+
+        for bucket in buckets:
+            bucket.consume()
+        metrics.increment("politeness.allowed")
+        return True
+
+    def get_wait(self, host: str, now: float | None = None) -> float:
+        """Returns how many seconds until every origin the host belongs to has room for it again."""
+        now = now if now is not None else time.monotonic()
+        buckets = [self.get_bucket(kind, value, now) for kind, value in self.get_keys(host)]
+        return max([bucket.get_wait(now) for bucket in buckets], default=0.0)
+
+
+origin_limiter = OriginLimiter(
+    ip_rate=settings.politeness_ip_rate,
+    ip_burst=settings.politeness_ip_burst,
+    asn_rate=settings.politeness_asn_rate,
+    asn_burst=settings.politeness_asn_burst,
+)
@@ -0,0 +1,256 @@
+import json
+import sqlite3
+import threading
+import zlib
+from logging import getLogger
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Tuple, Type, cast
+
+import httpx
+from pydantic import BaseModel
+
+from fedimapper.services import asn_lookup, networking, resolver, www
+from fedimapper.settings import settings
+
+logger = getLogger(__name__)
+
+# A corpus is a single sqlite file holding every response an ingest saw, along with the DNS and ASN
+# answers, so ingests can be run again later without touching the network. Bodies are stored as they
+# were sent, and only as far as the ingest read them (up to `replay_max_body_bytes`), then compressed
+# with zlib.
+#
+# Requests that send range or cache validator headers are recorded separately for each set of values,
+# so a replay only finds them when it starts from the same database the recording did.
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS responses (
+        method TEXT NOT NULL,
+        url TEXT NOT NULL,
+        variant TEXT NOT NULL,
+        status_code INTEGER NOT NULL,
+        headers TEXT NOT NULL,
+        body BLOB NOT NULL,
+        PRIMARY KEY (method, url, variant)
+    )""",
+    """CREATE TABLE IF NOT EXISTS lookups (
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        PRIMARY KEY (kind, key)
+    )""",
+    """CREATE TABLE IF NOT EXISTS hosts (
+        host TEXT PRIMARY KEY
+    )""",
+]
+
+# The body is stored whole, so how it was framed on the wire doesn't apply to it.
+DROPPED_HEADERS = set(["transfer-encoding"])
+
+# Request headers that change which response a server sends.
+VARIANT_HEADERS = ["range", "if-none-match", "if-modified-since"]
+
+# Transport errors are replayed as the same exception class, after whatever part of the body arrived.
+ERROR_HEADER = "x-replay-error"
+
+
+def get_variant(request: httpx.Request) -> str:
+    values = [[name, request.headers[name]] for name in VARIANT_HEADERS if name in request.headers]
+    return json.dumps(values) if values else ""
+
+
+class Corpus:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+
+    def save_response(
+        self, method: str, url: str, status_code: int, headers: List[Tuple[str, str]], body: bytes, variant: str = ""
+    ) -> None:
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (method, url, variant, status_code, json.dumps(headers), zlib.compress(body)),
+            )
+
+    def get_response(self, method: str, url: str, variant: str = "") -> Tuple[int, List[Tuple[str, str]], bytes] | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT status_code, headers, body FROM responses WHERE method = ? AND url = ? AND variant = ?",
+                (method, url, variant),
+            ).fetchone()
+        if not row:
+            return None
+        return row[0], [(x[0], x[1]) for x in json.loads(row[1])], zlib.decompress(row[2])
+
+    def save_lookup(self, kind: str, key: str, value: Any) -> None:
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO lookups VALUES (?, ?, ?)", (kind, key, json.dumps(value)))
+
+    def get_lookup(self, kind: str, key: str) -> Tuple[bool, Any]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT value FROM lookups WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+        if not row:
+            return False, None
+        return True, json.loads(row[0])
+
+    def add_host(self, host: str) -> None:
+        with self.lock:
+            self.connection.execute("INSERT OR IGNORE INTO hosts VALUES (?)", (host,))
+
+    def get_hosts(self) -> List[str]:
+        with self.lock:
+            return [row[0] for row in self.connection.execute("SELECT host FROM hosts ORDER BY rowid")]
+
+
+class RecordingStream(httpx.AsyncByteStream):
+    """Passes the body through as it is read, and saves the part that was read once it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, save: Callable[[bytes, str | None], None]):
+        self.stream = stream
+        self.save = save
+        self.body = bytearray()
+        self.error: str | None = None
+        self.saved = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self.stream:
+                remaining = settings.replay_max_body_bytes - len(self.body)
+                if remaining > 0:
+                    self.body.extend(chunk[:remaining])
+                yield chunk
+        except httpx.TransportError as exc:
+            self.error = type(exc).__name__
+            raise
+
+    async def aclose(self) -> None:
+        try:
+            await self.stream.aclose()
+        finally:
+            if not self.saved:
+                self.saved = True
+                self.save(bytes(self.body), self.error)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Passes requests on to the real transport and saves a copy of every response."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, corpus: Corpus):
+        self.transport = transport
+        self.corpus = corpus
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        variant = get_variant(request)
+        try:
+            response = await self.transport.handle_async_request(request)
+        except httpx.TransportError as exc:
+            error_headers = [(ERROR_HEADER, type(exc).__name__)]
+            self.corpus.save_response(request.method, str(request.url), 0, error_headers, b"", variant)
+            raise
+
+        headers = [(key, value) for key, value in response.headers.items() if key.lower() not in DROPPED_HEADERS]
+
+        def save(body: bytes, error: str | None) -> None:
+            saved_headers = headers + [(ERROR_HEADER, error)] if error else headers
+            self.corpus.save_response(
+                request.method, str(request.url), response.status_code, saved_headers, body, variant
+            )
+
+        # Only what the caller reads is recorded, so its size limits also bound the recording.
+        stream = RecordingStream(cast(httpx.AsyncByteStream, response.stream), save)
+        return httpx.Response(
+            response.status_code, headers=response.headers, stream=stream, extensions=response.extensions
+        )
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class ReplayedStream(httpx.AsyncByteStream):
+    def __init__(self, body: bytes, error: Exception | None):
+        self.body = body
+        self.error = error
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        if self.body:
+            yield self.body
+        if self.error:
+            raise self.error
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves responses from a corpus. Anything that wasn't recorded fails as if the host was unreachable."""
+
+    def __init__(self, corpus: Corpus):
+        self.corpus = corpus
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        recorded = self.corpus.get_response(request.method, str(request.url), get_variant(request))
+        if not recorded:
+            raise httpx.ConnectError(f"{request.url} is not in the replay corpus.", request=request)
+
+        status_code, headers, body = recorded
+        error = None
+        error_name = dict(headers).get(ERROR_HEADER, None)
+        if status_code == 0 or error_name:
+            error_name = error_name or "ConnectError"
+            error_class = getattr(httpx, error_name, httpx.ConnectError)
+            error = error_class(f"Replayed {error_name} for {request.url}", request=request)
+            if status_code == 0:
+                raise error
+
+        headers = [(key, value) for key, value in headers if key != ERROR_HEADER]
+        return httpx.Response(
+            status_code,
+            headers=headers,
+            stream=ReplayedStream(body, error),
+            extensions={"http_version": b"HTTP/1.1"},
+        )
+
+
+def wrap_lookup(
+    kind: str,
+    corpus: Corpus,
+    lookup: Callable[[str], Awaitable[BaseModel | None]],
+    model: Type[BaseModel] | None = None,
+    missing: Any = None,
+):
+    """Records the results of a lookup function, or replays them when a model to load them into is given."""
+
+    async def recorded_lookup(key: str):
+        if model:
+            found, value = corpus.get_lookup(kind, key)
+            if not found or value is None:
+                return missing
+            return model.parse_obj(value)
+
+        result = await lookup(key)
+        corpus.save_lookup(kind, key, result.dict() if result is not None else None)
+        return result
+
+    return recorded_lookup
+
+
+def start_recording(path: str | Path) -> Corpus:
+    corpus = Corpus(path)
+    www.set_transport_wrapper(lambda transport: RecordingTransport(transport, corpus))
+    resolver.lookup_host = wrap_lookup("dns", corpus, resolver.lookup_host)  # type: ignore
+    networking.get_asn_data = wrap_lookup("asn", corpus, networking.get_asn_data)  # type: ignore
+    logger.info(f"Recording responses to {path}")
+    return corpus
+
+
+def start_replay(path: str | Path) -> Corpus:
+    corpus = Corpus(path)
+    www.set_transport_wrapper(lambda transport: ReplayTransport(corpus))
+    resolver.lookup_host = wrap_lookup(  # type: ignore
+        "dns", corpus, resolver.lookup_host, resolver.HostAddresses, resolver.HostAddresses()
+    )
+    networking.get_asn_data = wrap_lookup("asn", corpus, networking.get_asn_data, asn_lookup.ASNRecord)  # type: ignore
+    logger.info(f"Replaying responses from {path}")
+    return corpus
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from logging import getLogger
+from typing import Dict, Tuple
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+from cachetools import TLRUCache
+from pydantic import BaseModel
+
+from fedimapper.settings import settings
+
+logger = getLogger(__name__)
+
+
+class HostAddresses(BaseModel):
+    ipv4: str | None = None
+    ipv6: str | None = None
+    ttl: float = 0
+    timed_out: bool = False
+
+    @property
+    def address(self) -> str | None:
+        return self.ipv4 or self.ipv6
+
+
+def _get_expiration(key: str, value: HostAddresses, now: float) -> float:
+    return now + value.ttl
+
+
+# Shared by every ingest running in this process. Each entry expires according to the TTL of its own records,
+# and hosts that failed to resolve are cached using the negative TTL.
+dns_cache: TLRUCache = TLRUCache(maxsize=settings.cache_size_dns, ttu=_get_expiration, timer=time.monotonic)
+
+# Concurrent ingests asking for the same host share a single lookup.
+pending_lookups: Dict[str, asyncio.Task] = {}
+
+_resolver: dns.asyncresolver.Resolver | None = None
+
+
+def get_resolver() -> dns.asyncresolver.Resolver:
+    global _resolver
+    if not _resolver:
+        _resolver = dns.asyncresolver.Resolver()
+        _resolver.timeout = settings.dns_timeout
+        _resolver.lifetime = settings.dns_timeout
+    return _resolver
+
+
+async def resolve_host(host: str) -> HostAddresses:
+    if host in dns_cache:
+        return dns_cache[host]
+
+    if host not in pending_lookups:
+        pending_lookups[host] = asyncio.create_task(lookup_host(host))
+
+    try:
+        addresses = await asyncio.shield(pending_lookups[host])
+    finally:
+        pending_lookups.pop(host, None)
+
+    # A lookup that timed out says nothing about the host, so it is tried again by the next ingest.
+    if not addresses.timed_out:
+        dns_cache[host] = addresses
+    return addresses
+
+
+async def lookup_host(host: str) -> HostAddresses:
+    # A and AAAA are looked up together so a host without DNS costs at most one timeout.
+    (ipv4, ipv4_ttl), (ipv6, ipv6_ttl) = await asyncio.gather(
+        lookup_record(host, "A"),
+        lookup_record(host, "AAAA"),
+    )
+
+    if ipv4 or ipv6:
+        ttls = [ttl for address, ttl in [(ipv4, ipv4_ttl), (ipv6, ipv6_ttl)] if address and ttl is not None]
+        ttl = min(max(min(ttls), settings.dns_min_ttl), settings.dns_max_ttl)
+    elif ipv4_ttl is None or ipv6_ttl is None:
+        return HostAddresses(timed_out=True)
+    else:
+        ttl = settings.dns_negative_ttl
+
+    return HostAddresses(ipv4=ipv4, ipv6=ipv6, ttl=ttl)
+
+
+async def lookup_record(host: str, record_type: str) -> Tuple[str | None, float | None]:
+    """Returns the first record of a type along with how long it can be cached for.
+
+    Lookups that time out have no TTL, since there is no answer to cache.
+    """
+    try:
+        answer = await get_resolver().resolve(host, record_type)
+    except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.resolver.NoNameservers):
+        return None, 0
+    except dns.exception.Timeout:
+        logger.debug(f"Timed out looking up {record_type} records for {host}")
+        return None, None
+    except dns.exception.DNSException:
+        logger.debug(f"Unable to look up {record_type} records for {host}")
+        return None, 0
+
+    if len(answer) < 1:
+        return None, 0
+
+    # The expiration accounts for every record in a CNAME chain, not just the final one.
+    return answer[0].to_text(), answer.expiration - time.time()
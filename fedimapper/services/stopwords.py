@@ -29,13 +29,13 @@ def get_language_stop_words(language: str, suppress_error: bool = False) -> Set[
 
     if not language_file:
         if suppress_error:
-            return Set([])
+            return set([])
         raise ValueError(f"No registered language file for language file for {language}.")
 
     path_file = __repo_base / language_file
     if not path_file.exists():
         if suppress_error:
-            return Set([])
+            return set([])
         raise ValueError(f"Unable to find language file for {language}.")
 
     try:
@@ -1,23 +1,51 @@
+import asyncio
 import datetime
-import json
 import re
-from functools import lru_cache
-from threading import Lock
-from typing import Any, Tuple
+import time
+from contextlib import AsyncExitStack, aclosing, asynccontextmanager
+from contextvars import ContextVar
+from logging import getLogger
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Dict, List, Tuple
 from urllib.parse import urlparse
 from urllib.robotparser import RobotFileParser
 
 import httpx
-from cachetools import TTLCache, cached
+from cachetools import LRUCache, TTLCache
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from fedimapper.models.http_validator import HttpValidator
+from fedimapper.models.robots import RobotsTxt
+from fedimapper.services import db_session
 from fedimapper.settings import settings
+from fedimapper.utils import codec, metrics
+from fedimapper.utils.json_stream import JSONArrayParser
 
 DEFAULT_HEADERS = {"user-agent": settings.crawler_user_agent}
 DEFAULT_MAX_BYTES = 1024 * 1024 * 4
 DEFAULT_MAX_REQUEST_TIME = 10
 
+logger = getLogger(__name__)
 
-client = httpx.Client(headers=DEFAULT_HEADERS)
+# Loading the CA bundle is expensive, so every client in the process shares a single SSL context.
+SSL_CONTEXT = httpx.create_ssl_context()
+
+# Lets the replay harness record or serve every response, see `fedimapper.services.replay`.
+transport_wrapper: Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport] | None = None
+
+
+def make_transport(**kwargs) -> httpx.AsyncBaseTransport:
+    transport = httpx.AsyncHTTPTransport(verify=SSL_CONTEXT, **kwargs)
+    return transport_wrapper(transport) if transport_wrapper else transport
+
+
+def set_transport_wrapper(wrapper: Callable[[httpx.AsyncBaseTransport], httpx.AsyncBaseTransport] | None) -> None:
+    global client, transport_wrapper
+    transport_wrapper = wrapper
+    client = httpx.AsyncClient(headers=DEFAULT_HEADERS, transport=make_transport())
+
+
+client = httpx.AsyncClient(headers=DEFAULT_HEADERS, transport=make_transport())
 
 
 class WWWException(Exception):
@@ -44,80 +72,588 @@ class NoContent(WWWException):
     pass
 
 
-@cached(cache=TTLCache(maxsize=1024 * 1024 * settings.cache_size_robots, ttl=1800), lock=Lock())
-def get_robots(host) -> RobotFileParser:
+class NotModified(WWWException):
+    pass
+
+
+robots_cache: TTLCache = TTLCache(maxsize=1024 * 1024 * settings.cache_size_robots, ttl=settings.robots_cache_ttl)
+
+# Concurrent ingests for the same host share a single robots.txt lookup.
+pending_robots: Dict[str, asyncio.Task] = {}
+
+# Earliest time the next request to each host may be sent, for hosts that set a Crawl-delay.
+crawl_schedule: TTLCache = TTLCache(maxsize=1024 * 1024, ttl=settings.robots_max_crawl_delay * 2)
+
+ROBOTS_FIELDS = set(["user-agent", "allow", "disallow", "crawl-delay", "request-rate"])
+
+
+class HostSession:
+    """A client dedicated to a single ingest, so every request to the host shares the same connections.
+
+    Servers that support HTTP/2 get all of the requests multiplexed over one connection, and the others
+    keep their connections alive between requests instead of relying on whatever the shared pool kept.
+    """
+
+    def __init__(self):
+        limits = httpx.Limits(
+            max_connections=settings.http_host_max_connections,
+            max_keepalive_connections=settings.http_host_max_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        )
+        self.client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            transport=make_transport(http2=settings.http2_enabled, limits=limits),
+        )
+        self.requests = 0
+        self.tcp_connections = 0
+        self.tls_handshakes = 0
+        self.latency_samples = 0
+        self.prefetched: Dict[str, Tuple[Dict[str, Any], asyncio.Task]] = {}
+        # Validators from this ingest's downloads, saved by the ingest in its own transaction.
+        self.validators: Dict[str, Dict[str, Any]] = {}
+        self.latency_average: float | None = None
+        self.latency_deviation: float | None = None
+
+    def load_latency(self, average: float | None, deviation: float | None) -> None:
+        if average is not None and deviation is not None:
+            self.latency_average = average
+            self.latency_deviation = deviation
+
+    def observe_latency(self, seconds: float) -> None:
+        # Smoothed average and mean deviation, the same estimator TCP uses for its retransmission timer.
+        self.latency_samples += 1
+        metrics.observe("www.latency", seconds)
+        if self.latency_average is None or self.latency_deviation is None:
+            self.latency_average = seconds
+            self.latency_deviation = seconds / 2
+            return
+        error = seconds - self.latency_average
+        self.latency_average += settings.latency_average_weight * error
+        self.latency_deviation += settings.latency_deviation_weight * (abs(error) - self.latency_deviation)
+
+    def get_timeout(self, default: float) -> Tuple[httpx.Timeout, float]:
+        """Returns the timeouts for a request along with the time limit for downloading its body.
+
+        Hosts without any history get the default. Otherwise the timeouts come from the host's usual
+        response time- tight for hosts that are normally quick so stalls fail fast, but never longer than
+        the default unless the host's history shows it is slow but reliable.
+        """
+        if self.latency_average is None or self.latency_deviation is None:
+            return httpx.Timeout(default), default
+        expected = self.latency_average + settings.latency_timeout_deviations * self.latency_deviation
+        limit = default
+        if expected > default:
+            limit = max(default, min(expected * 2, settings.timeout_max))
+        connect = min(max(expected, settings.timeout_min), limit)
+        read = min(max(expected * 2, settings.timeout_min), limit)
+        return httpx.Timeout(read, connect=connect), limit
+
+    async def trace(self, event: str, info: Dict[str, Any]) -> None:
+        if event == "connection.connect_tcp.complete":
+            self.tcp_connections += 1
+            metrics.increment("www.connections.tcp")
+        elif event == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+            metrics.increment("www.connections.tls")
+
+
+# The session for the ingest currently running in this task, if there is one.
+current_session: ContextVar[HostSession | None] = ContextVar("current_session", default=None)
+
+# How many ingests are running in this process, as each one holds a session.
+active_sessions = 0
+
+
+@asynccontextmanager
+async def host_session() -> AsyncIterator[HostSession]:
+    global active_sessions
+    session = HostSession()
+    token = current_session.set(session)
+    active_sessions += 1
+    try:
+        yield session
+    finally:
+        active_sessions -= 1
+        current_session.reset(token)
+        await close_prefetched(session)
+        await session.client.aclose()
+        metrics.increment("www.sessions")
+        metrics.set_gauge("www.connections.tcp_per_session", metrics.ratio("www.connections.tcp", "www.sessions"))
+        metrics.set_gauge("www.connections.tls_per_session", metrics.ratio("www.connections.tls", "www.sessions"))
+        logger.debug(
+            f"Host session made {session.requests} requests over {session.tcp_connections} connections "
+            f"with {session.tls_handshakes} TLS handshakes."
+        )
+
+
+def get_timeout(default: float) -> Tuple[httpx.Timeout, float]:
+    session = current_session.get()
+    if not session:
+        return httpx.Timeout(default), default
+    return session.get_timeout(default)
+
+
+def get_client() -> Tuple[httpx.AsyncClient, Dict[str, Any]]:
+    """Returns the client for the current ingest (or the shared client outside of one) and request extensions."""
+    session = current_session.get()
+    if not session:
+        return client, {}
+    session.requests += 1
+    return session.client, {"trace": session.trace}
+
+
+async def get_robots(host) -> RobotFileParser:
+    if host in robots_cache:
+        metrics.increment("robots.cache.local_hits")
+        return robots_cache[host]
+
+    if host not in pending_robots:
+        pending_robots[host] = asyncio.create_task(load_robots(host))
+
+    try:
+        rp = await asyncio.shield(pending_robots[host])
+    finally:
+        pending_robots.pop(host, None)
+
+    robots_cache[host] = rp
+    return rp
+
+
+async def load_robots(host) -> RobotFileParser:
+    """Loads robots.txt rules from the database, only fetching them when the stored copy has expired.
+
+    The database copy is shared by every worker, so the file is only downloaded once per TTL window
+    no matter how many processes crawl the host or how often they are restarted.
+    """
+    expiration = datetime.datetime.utcnow() - datetime.timedelta(seconds=settings.robots_cache_ttl)
+    async with db_session.get_session() as session:
+        stored = await session.get(RobotsTxt, host)
+        if stored and stored.fetched_at >= expiration:
+            metrics.increment("robots.cache.shared_hits")
+            return parse_robots(stored.status_code, stored.rules)
+
+    metrics.increment("robots.fetches")
+    response, contents = await get_safe(f"{host}/robots.txt", validate_robots=False)
+    rules = clean_robots(contents.decode("utf-8", errors="replace")) if contents else None
+    rp = parse_robots(response.status_code, rules)
+
+    async with db_session.get_session() as session:
+        robots_insert_stmt = insert(RobotsTxt).values(
+            [
+                {
+                    "base_url": host,
+                    "status_code": response.status_code,
+                    "rules": rules,
+                    "crawl_delay": rp.crawl_delay(settings.crawler_user_agent),
+                    "fetched_at": datetime.datetime.utcnow(),
+                }
+            ]
+        )
+        robots_update_stmt = robots_insert_stmt.on_conflict_do_update(
+            index_elements=["base_url"],
+            set_=dict(
+                status_code=robots_insert_stmt.excluded.status_code,
+                rules=robots_insert_stmt.excluded.rules,
+                crawl_delay=robots_insert_stmt.excluded.crawl_delay,
+                fetched_at=robots_insert_stmt.excluded.fetched_at,
+            ),
+        )
+        await session.execute(robots_update_stmt)
+        await session.commit()
+
+    return rp
+
+
+def clean_robots(contents: str) -> str:
+    # Only the directives the parser understands are kept, which keeps the stored rules small.
+    rules = []
+    for line in contents.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if ":" in line and line.split(":", 1)[0].strip().lower() in ROBOTS_FIELDS:
+            rules.append(line)
+    return "\n".join(rules)
+
+
+def parse_robots(status_code: int, rules: str | None) -> RobotFileParser:
     rp = RobotFileParser()
-    response, contents = get_safe(f"{host}/robots.txt", validate_robots=False)
-    if response.status_code in (401, 403):
+    if status_code in (401, 403):
         rp.disallow_all = True  # type: ignore
-    elif response.status_code >= 400 and response.status_code < 500:
+    elif status_code >= 400 and status_code < 500:
         rp.allow_all = True  # type: ignore
-    if contents:
-        rp.parse(contents.decode("utf-8").splitlines())
+    if rules is not None:
+        rp.parse(rules.splitlines())
     return rp
 
 
+async def wait_for_crawl_delay(url: str, robot: RobotFileParser) -> None:
+    delay = robot.crawl_delay(settings.crawler_user_agent)
+    if not delay:
+        return
+
+    # Each request reserves the next open slot for its host, so concurrent requests are spaced out too.
+    base = url_to_base(url)
+    now = time.monotonic()
+    scheduled = max(now, crawl_schedule.get(base, now))
+    crawl_schedule[base] = scheduled + min(float(delay), settings.robots_max_crawl_delay)
+    if scheduled > now:
+        metrics.increment("robots.crawl_delay.waits")
+        await asyncio.sleep(scheduled - now)
+
+
 def url_to_base(url: str) -> str:
     parsed = urlparse(url)
     return f"{parsed.scheme}://{parsed.netloc}"
 
 
-def can_crawl(url: str) -> bool:
-    robot = get_robots(url_to_base(url))
+async def can_crawl(url: str) -> bool:
+    robot = await get_robots(url_to_base(url))
     return robot.can_fetch(settings.crawler_user_agent, url)
 
 
-def get(url: str) -> httpx.Response:
-    if not can_crawl(url):
+async def check_robots(url: str) -> None:
+    robot = await get_robots(url_to_base(url))
+    if not robot.can_fetch(settings.crawler_user_agent, url):
         raise RobotBlocked(f"blocked by robots.txt from crawling {url}")
-    return client.get(url, headers=DEFAULT_HEADERS)
+    await wait_for_crawl_delay(url, robot)
+
+
+async def get(url: str) -> httpx.Response:
+    await check_robots(url)
+    request_client, extensions = get_client()
+    return await request_client.get(url, headers=DEFAULT_HEADERS, extensions=extensions)
+
 
+class LimitedBody:
+    """Iterates over a response body, enforcing the size and time limits as the chunks arrive."""
 
-def get_safe(
+    def __init__(self, url: str, response: httpx.Response, max_size: int, timeout: float, start: datetime.datetime):
+        self.url = url
+        self.response = response
+        self.max_size = max_size
+        self.timeout = timeout
+        self.start = start
+        self.complete = False
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self.chunks()
+
+    async def chunks(self) -> AsyncGenerator[bytes, None]:
+        endpoint = urlparse(self.url).path or "/"
+        length = 0
+        try:
+            async for chunk in self.response.aiter_bytes():
+                length += len(chunk)
+                if length > self.max_size:
+                    raise ExcessivelyLargeRequest(f"Request to `{self.url}` is too large.")
+                if (datetime.datetime.utcnow() - self.start).total_seconds() >= self.timeout:
+                    raise ExcessivelySlowRequest(f"Request to `{self.url}` is too slow.")
+                yield chunk
+            self.complete = True
+        finally:
+            metrics.increment(f"www.bytes.{endpoint}", length)
+
+
+def prefetch(
+    url: str,
+    max_size: int = DEFAULT_MAX_BYTES,
+    timeout: float = DEFAULT_MAX_REQUEST_TIME,
+    conditional: bool = False,
+) -> None:
+    """Starts a request in the background so it runs alongside the rest of the ingest.
+
+    Only the response headers are waited on. The body is read when `stream_safe` (or anything built on
+    it) is later called with the same arguments, so the regular size, time and robots limits all still
+    apply. Prefetches that are never used are closed when the host session ends.
+    """
+    session = current_session.get()
+    if not session or url in session.prefetched:
+        return
+    params = {"max_size": max_size, "timeout": timeout, "conditional": conditional}
+    task = asyncio.create_task(open_prefetched(url, params))
+    session.prefetched[url] = (params, task)
+    metrics.increment("www.prefetch.started")
+
+
+async def open_prefetched(url: str, params: Dict[str, Any]):
+    context = open_stream(url, **params)
+    r, body = await context.__aenter__()
+    return context, r, body
+
+
+def pop_prefetched(url: str, params: Dict[str, Any]) -> asyncio.Task | None:
+    session = current_session.get()
+    if not session or url not in session.prefetched:
+        return None
+    prefetched_params, task = session.prefetched[url]
+    if prefetched_params != params:
+        return None
+    del session.prefetched[url]
+    return task
+
+
+async def close_prefetched(session: HostSession | None = None) -> None:
+    session = session or current_session.get()
+    if not session:
+        return
+    prefetched = session.prefetched
+    session.prefetched = {}
+
+    # Requests still waiting on their headers are cancelled rather than waited on, since nothing will read them.
+    pending = [task for params, task in prefetched.values() if not task.done()]
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    metrics.increment("www.prefetch.cancelled", len(pending))
+
+    for url, (params, task) in prefetched.items():
+        metrics.increment("www.prefetch.unused")
+        if task in pending or task.cancelled() or task.exception():
+            # Errors only matter to whoever would have read the response.
+            continue
+        context, r, body = task.result()
+        try:
+            await context.__aexit__(None, None, None)
+        except Exception:
+            pass
+
+
+@asynccontextmanager
+async def stream_safe(
     url: str,
     max_size: int = DEFAULT_MAX_BYTES,
     timeout: float = DEFAULT_MAX_REQUEST_TIME,
     validate_robots: bool = True,
     follow_redirects: bool = False,
-) -> Tuple[httpx.Response, bytes | None]:
+    conditional: bool = False,
+    extra_headers: Dict[str, str] | None = None,
+) -> AsyncIterator[Tuple[httpx.Response, LimitedBody]]:
+    task = None
+    if validate_robots and not follow_redirects and not extra_headers:
+        task = pop_prefetched(url, {"max_size": max_size, "timeout": timeout, "conditional": conditional})
+
+    if not task:
+        async with open_stream(
+            url, max_size, timeout, validate_robots, follow_redirects, conditional, extra_headers
+        ) as (r, body):
+            yield r, body
+        return
+
+    # Errors from the prefetched request are raised here, just as they would have been without it.
+    context, r, body = await task
+    metrics.increment("www.prefetch.used")
+    body.start = datetime.datetime.utcnow()
+    async with AsyncExitStack() as stack:
+        stack.push_async_exit(context)
+        yield r, body
+
+
+@asynccontextmanager
+async def open_stream(
+    url: str,
+    max_size: int = DEFAULT_MAX_BYTES,
+    timeout: float = DEFAULT_MAX_REQUEST_TIME,
+    validate_robots: bool = True,
+    follow_redirects: bool = False,
+    conditional: bool = False,
+    extra_headers: Dict[str, str] | None = None,
+) -> AsyncIterator[Tuple[httpx.Response, LimitedBody]]:
 
-    if validate_robots and not can_crawl(url):
-        raise RobotBlocked(f"blocked by robots.txt from crawling {url}")
+    if validate_robots:
+        await check_robots(url)
+
+    headers = {**DEFAULT_HEADERS, **extra_headers} if extra_headers else DEFAULT_HEADERS
+    if conditional:
+        headers = {**headers, **await get_validator_headers(url)}
+
+    endpoint = urlparse(url).path or "/"
+    metrics.increment(f"www.requests.{endpoint}")
 
     start = datetime.datetime.utcnow()
-    with client.stream("GET", url, headers=DEFAULT_HEADERS, follow_redirects=follow_redirects, timeout=timeout) as r:
+    request_client, extensions = get_client()
+    request_timeout, time_limit = get_timeout(timeout)
+    try:
+        async with request_client.stream(
+            "GET",
+            url,
+            headers=headers,
+            follow_redirects=follow_redirects,
+            timeout=request_timeout,
+            extensions=extensions,
+        ) as r:
+            session = current_session.get()
+            if session:
+                session.observe_latency((datetime.datetime.utcnow() - start).total_seconds())
+
+            metrics.increment(f"www.http_version.{r.http_version}")
+            if conditional and r.status_code == 304:
+                metrics.increment(f"www.not_modified.{endpoint}")
+                metrics.set_gauge(
+                    f"www.not_modified_rate.{endpoint}",
+                    metrics.ratio(f"www.not_modified.{endpoint}", f"www.requests.{endpoint}"),
+                )
+                raise NotModified(f"`{url}` has not changed since it was last downloaded.")
+
+            body = LimitedBody(url, r, max_size, time_limit, start)
+            yield r, body
+    except httpx.TimeoutException:
+        metrics.increment("www.timeouts")
+        raise
+
+    # Validators are only kept once the whole body has been processed.
+    if conditional and r.status_code == 200 and body.complete:
+        validator = get_validator(url, r)
+        if validator:
+            # The ingest may be holding a write transaction open, so its validators are left for it to save.
+            session = current_session.get()
+            if session:
+                session.validators[url] = validator
+            else:
+                async with db_session.get_session() as db:
+                    await save_validators(db, [validator])
+                    await db.commit()
+
+
+async def get_safe(
+    url: str,
+    max_size: int = DEFAULT_MAX_BYTES,
+    timeout: float = DEFAULT_MAX_REQUEST_TIME,
+    validate_robots: bool = True,
+    follow_redirects: bool = False,
+    conditional: bool = False,
+) -> Tuple[httpx.Response, bytes | None]:
+    async with stream_safe(url, max_size, timeout, validate_robots, follow_redirects, conditional) as (r, body):
         if int(r.headers.get("Content-Length", 0)) > max_size:
             return r, None
-
-        data = []
-        length = 0
-        for chunk in r.iter_bytes():
-            data.append(chunk)
-            length += len(chunk)
-            if length > max_size:
-                raise ExcessivelyLargeRequest(f"Request to `{url}` is too large.")
-            if (datetime.datetime.utcnow() - start).total_seconds() >= timeout:
-                raise ExcessivelySlowRequest(f"Request to `{url}` is too slow.")
-
-        content = b"".join(data)
+        content = b"".join([chunk async for chunk in body])
     return r, content
 
 
-def get_json(url: str, max_size: int = DEFAULT_MAX_BYTES) -> Any:
-    response, content = get_safe(url, max_size)
+async def get_partial(
+    url: str,
+    size: int,
+    timeout: float = DEFAULT_MAX_REQUEST_TIME,
+    validate_robots: bool = True,
+    follow_redirects: bool = False,
+) -> Tuple[httpx.Response, bytes]:
+    """Downloads only the start of a page.
+
+    A range is requested so servers that support them only send that much, which leaves the connection
+    open for the next request. Anything else sent past the limit is dropped unread.
+    """
+    range_header = {"Range": f"bytes=0-{size - 1}"}
+    async with stream_safe(
+        url, DEFAULT_MAX_BYTES, timeout, validate_robots, follow_redirects, extra_headers=range_header
+    ) as (r, body):
+        metrics.increment(f"www.partial.status.{r.status_code}")
+        data = bytearray()
+        async with aclosing(body.chunks()) as chunks:
+            async for chunk in chunks:
+                data.extend(chunk)
+                # Ranged responses are read to the end so the connection can be reused.
+                if len(data) >= size and r.status_code != 206:
+                    break
+    return r, bytes(data[:size])
+
+
+async def get_json(url: str, max_size: int = DEFAULT_MAX_BYTES, conditional: bool = False) -> Any:
+    response, content = await get_safe(url, max_size, conditional=conditional)
     response.raise_for_status()
     if not content:
         raise NoContent(f"No content body for {url}")
-    return json.loads(content.decode("utf-8"), strict=False)
+    return codec.loads(content)
+
+
+async def stream_json_array(
+    url: str,
+    max_size: int = DEFAULT_MAX_BYTES,
+    timeout: float = DEFAULT_MAX_REQUEST_TIME,
+    conditional: bool = False,
+) -> AsyncIterator[List[Any]]:
+    """Yields the items of a JSON array in batches as they are downloaded.
+
+    The rest of the response is still streaming while each batch is processed, so only a single batch
+    (plus whatever item is partially downloaded) is ever held in memory.
+    """
+    async with stream_safe(url, max_size, timeout, conditional=conditional) as (response, body):
+        response.raise_for_status()
+        if int(response.headers.get("Content-Length", 0)) > max_size:
+            raise ExcessivelyLargeRequest(f"Request to `{url}` is too large.")
+
+        parser = JSONArrayParser()
+        batch: List[Any] = []
+        async for chunk in body:
+            batch.extend(parser.feed(chunk))
+            while len(batch) >= settings.stream_batch_size:
+                yield batch[: settings.stream_batch_size]
+                batch = batch[settings.stream_batch_size :]
+
+        if not parser.started:
+            raise NoContent(f"No content body for {url}")
+        batch.extend(parser.close())
+        if len(batch) > 0:
+            yield batch
+
+
+async def get_validator_headers(url: str) -> Dict[str, str]:
+    # Validators are ignored once they get too old so every endpoint is periodically downloaded in full.
+    expiration = datetime.datetime.utcnow() - datetime.timedelta(hours=settings.conditional_get_max_age_hours)
+    async with db_session.get_session() as session:
+        validator = await session.get(HttpValidator, url)
+
+    headers = {}
+    if validator and validator.checked_at >= expiration:
+        if validator.etag:
+            headers["If-None-Match"] = validator.etag
+        if validator.last_modified:
+            headers["If-Modified-Since"] = validator.last_modified
+    return headers
+
+
+def get_validator(url: str, response: httpx.Response) -> Dict[str, Any] | None:
+    etag = response.headers.get("ETag", None)
+    last_modified = response.headers.get("Last-Modified", None)
+    if not etag and not last_modified:
+        return None
+    return {
+        "url": url,
+        "etag": etag,
+        "last_modified": last_modified,
+        "checked_at": datetime.datetime.utcnow(),
+    }
+
+
+async def save_validators(session: AsyncSession, validators: List[Dict[str, Any]]) -> None:
+    """Upserts validators through the caller's session, which commits them."""
+    if len(validators) <= 0:
+        return
+    validator_insert_stmt = insert(HttpValidator).values(validators)
+    validator_update_stmt = validator_insert_stmt.on_conflict_do_update(
+        index_elements=["url"],
+        set_=dict(
+            etag=validator_insert_stmt.excluded.etag,
+            last_modified=validator_insert_stmt.excluded.last_modified,
+            checked_at=validator_insert_stmt.excluded.checked_at,
+        ),
+    )
+    await session.execute(validator_update_stmt)
 
 
 HOST_RE = re.compile(r"template=\"https://(?P<host>.*)/.well-known/webfinger", re.MULTILINE)
 
+# Coroutines can't be wrapped by `functools.lru_cache` (the cached coroutine can only be awaited once),
+# so the resolved hosts are memoized directly. Long term storage is `Instance.www_host`.
+actual_host_cache: LRUCache = LRUCache(maxsize=settings.cache_size_host_meta)
+
+
+async def get_node_actual_host(host: str) -> str:
+    if host not in actual_host_cache:
+        actual_host_cache[host] = await lookup_node_actual_host(host)
+    return actual_host_cache[host]
+
 
-@lru_cache
-def get_node_actual_host(host: str) -> str:
+async def lookup_node_actual_host(host: str) -> str:
     try:
-        response, content = get_safe(f"https://{host}/.well-known/host-meta", follow_redirects=True)
+        response, content = await get_safe(f"https://{host}/.well-known/host-meta", follow_redirects=True)
         response.raise_for_status()
         if not content:
             return host
@@ -29,8 +29,62 @@ class Settings(queuerunner.Settings):
 
     stale_rescan_hours: float = 0.90
     unreachable_rescan_hours: float = 6
+    unreachable_backoff_max_hours: float = 168
+    unreachable_backoff_jitter: float = 0.25
+    dormant_after_failures: int = 12
+    dormant_rescan_hours: float = 720
     cache_size_robots: int = 8
+    robots_cache_ttl: int = 3600
+    robots_max_crawl_delay: float = 60
+    cache_size_dns: int = 65536
+    cache_size_asn_prefixes: int = 65536
+    cache_size_host_meta: int = 16384
+    cache_size_politeness: int = 262144
     refresh_peers_hours: int = 12
+    conditional_get_max_age_hours: float = 24
+    host_meta_ttl_hours: float = 72
+    host_meta_negative_ttl_hours: float = 12
+    nodeinfo_link_ttl_hours: float = 168
+    ingest_prefetch: bool = True
+    ingest_lease_seconds: float = 1800
+    crawler_node_id: str | None = None
+    ingest_deadline: float = 600
+    quarantine_after_failures: int = 3
+    quarantine_hours: float = 168
+    isolated_ingest_deadline: float = 360
+
+    dns_timeout: float = 2.0
+    dns_min_ttl: int = 60
+    dns_max_ttl: int = 86400
+    dns_negative_ttl: int = 900
+
+    stream_batch_size: int = 1000
+    peers_max_bytes: int = 1024 * 1024 * 256
+    peers_max_request_time: float = 300
+
+    reachability_probe_bytes: int = 16384
+
+    latency_average_weight: float = 0.25
+    latency_deviation_weight: float = 0.25
+    latency_timeout_deviations: float = 4
+    timeout_min: float = 2
+    timeout_max: float = 30
+
+    http2_enabled: bool = True
+    http_host_max_connections: int = 4
+    http_keepalive_expiry: float = 30
+
+    replay_max_body_bytes: int = 1024 * 1024 * 16
+
+    politeness_ip_rate: float = 1
+    politeness_ip_burst: float = 5
+    politeness_asn_rate: float = 20
+    politeness_asn_burst: float = 100
+
+    asn_index_path: str | None = None
+    asn_lookup_batch_size: int = 100
+    asn_lookup_batch_wait: float = 0.25
+    asn_unannounced_ttl: int = 3600
 
     spam_domain_threshold: int = 100
     top_lists_min_threshold: int = 5
@@ -38,4 +92,12 @@ class Settings(queuerunner.Settings):
 
 settings = Settings()
 
-UNREADABLE_STATUSES = ["unreachable", "unknown_service", "no_dns", "disabled", "crawl_error", "robots_blocked"]
+UNREADABLE_STATUSES = [
+    "unreachable",
+    "unknown_service",
+    "no_dns",
+    "disabled",
+    "crawl_error",
+    "robots_blocked",
+    "crawl_timeout",
+]
@@ -1,8 +1,10 @@
+import asyncio
 import datetime
+import random
+import sys
 from logging import getLogger
-from typing import Any, Awaitable, Callable, Dict, TypeAlias, cast
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeAlias, cast
 
-import cymruwhois
 import httpx
 from sqlalchemy import and_, delete
 from sqlalchemy.dialects.sqlite import insert
@@ -11,11 +13,30 @@ from sqlalchemy.orm import Session
 
 from fedimapper.models.asn import ASN
 from fedimapper.models.ban import Ban
-from fedimapper.models.instance import Instance
-from fedimapper.services import db, networking, www
-from fedimapper.services.nodeinfo import NodeInfoInstance, get_nodeinfo
-from fedimapper.settings import settings
+from fedimapper.models.instance import (
+    INGEST_PRIORITY_DORMANT,
+    INGEST_PRIORITY_STALE,
+    INGEST_PRIORITY_UNREACHABLE,
+    Instance,
+)
+from fedimapper.services import (
+    asn_index,
+    asn_lookup,
+    db,
+    networking,
+    resolver,
+    stopwords,
+    www,
+)
+from fedimapper.services.nodeinfo import (
+    NodeInfoInstance,
+    get_nodeinfo_document,
+    get_nodeinfo_link,
+)
+from fedimapper.settings import UNREADABLE_STATUSES, settings
+from fedimapper.tasks import quarantine
 from fedimapper.tasks.ingesters import diaspora, mastodon, nodeinfo, peertube, utils
+from fedimapper.utils import metrics
 from fedimapper.utils.hash import sha256string
 
 logger = getLogger(__name__)
@@ -31,94 +52,308 @@ PROCESSORS = {
 }
 
 
-async def ingest_host(session: AsyncSession, host: str) -> bool:
-    logger.info(f"Ingesting from {host}")
+def warm_up() -> None:
+    """Loads the data every ingest needs but that is only read on first use.
 
-    try:
+    Workers forked after this share it with their parent instead of each loading their own copy.
+    """
+    utils.get_safe_fld("warm.up.example")
+    stopwords.get_language_stop_words("en", suppress_error=True)
+    asn_index.get_index()
 
-        for suffix in settings.evil_domains:
-            if host.endswith(suffix):
-                logger.info(f"Skipping ingest from {host} for matching evil pattern: {suffix}")
-                return False
 
-        # This lookup can be slow as it hits an API, so do it before
-        # there are any locks on the database.
-        web_host = www.get_node_actual_host(host)
-        ip_address = networking.get_ip_from_url(web_host)
+async def ingest_host(session: AsyncSession, host: str, isolated: bool = False) -> bool:
+    """Ingests a host under a deadline, counting the ingests that crash or run out of time against it.
+
+    Quarantined hosts are handed to a process of their own instead, so when one hangs or takes the
+    interpreter down with it only that process is lost.
+    """
+    if not isolated:
+        instance = await session.get(Instance, host)
+        if instance and instance.quarantined_until:
+            return await ingest_isolated(session, host)
+
+    deadline = settings.isolated_ingest_deadline if isolated else settings.ingest_deadline
+    try:
+        return await asyncio.wait_for(run_ingest(session, host), deadline)
+    except asyncio.TimeoutError:
+        logger.warning(f"Ingest of {host} was stopped after {deadline} seconds.")
+        await session.rollback()
+        await quarantine.record_failure(session, host, quarantine.TIMEOUT)
+        await session.commit()
+        return False
+    except Exception:
+        await session.rollback()
+        await quarantine.record_failure(session, host, quarantine.CRASH)
+        await session.commit()
+        raise
 
-        # Now do database stuff.
-        instance = await get_or_save_host(session, host)
-        instance.last_ingest = datetime.datetime.utcnow()
-        instance.www_host = web_host
-        if not instance.digest:
-            instance.digest = sha256string(host)
 
-        if not instance.base_domain:
-            instance.base_domain = utils.get_safe_fld(host)
+async def ingest_isolated(session: AsyncSession, host: str) -> bool:
+    metrics.increment("quarantine.isolated_runs")
+    logger.info(f"Ingesting quarantined host {host} in its own process")
 
+    # Nothing is left open on the database while the other process works on the host.
+    await session.commit()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "fedimapper.cli", "ingest-instance", host, "--isolated"
+    )
+    try:
+        # The process stops its own ingest at the deadline, so this only catches it stuck where that can't reach.
+        returncode = await asyncio.wait_for(process.wait(), settings.isolated_ingest_deadline + 30)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        logger.warning(f"Killed the isolated ingest of {host}.")
+        await quarantine.record_failure(session, host, quarantine.TIMEOUT)
         await session.commit()
+        return False
 
-        if not ip_address:
-            logger.info(f"No DNS for {host}")
-            instance.last_ingest_status = "no_dns"
-            await session.commit()
-            return False
+    # Errors raised in the process were already counted by it, but it can't count being killed.
+    if returncode < 0:
+        logger.warning(f"The isolated ingest of {host} was killed by signal {-returncode}.")
+        await quarantine.record_failure(session, host, quarantine.CRASH)
+        await session.commit()
+    return returncode == 0
 
-        instance.ip_address = ip_address
-        asn_info = networking.get_asn_data(ip_address)
-        if asn_info:
-            instance.asn = asn_info.asn
-            await save_asn(session, asn_info)
-            logger.debug(f"ASN Saved for {host}")
 
-        # Add Reachability Check on port 443
-        index_response, index_contents = networking.can_access_https(web_host)
+async def run_ingest(session: AsyncSession, host: str) -> bool:
+    logger.info(f"Ingesting from {host}")
 
-        if not index_response or not is_reachable(index_response, index_contents):
-            instance.last_ingest_status = "unreachable"
-            await session.commit()
-            logger.info(f"Unable to reach {host} as {web_host}")
-            return False
+    instance = None
+    cancelled = False
+
+    # Every request made during the ingest shares one client, so connections to the host are reused.
+    async with www.host_session() as http:
+        try:
+
+            for suffix in settings.evil_domains:
+                if host.endswith(suffix):
+                    logger.info(f"Skipping ingest from {host} for matching evil pattern: {suffix}")
+                    return False
+
+            # These lookups can be slow as they hit the network, so do them before
+            # there are any locks on the database. Hosts without DNS can't serve
+            # a host-meta file, so that request is skipped for them.
+            known = await session.get(Instance, host)
+            if known:
+                http.load_latency(known.latency_average, known.latency_deviation)
+            addresses = await resolver.resolve_host(host)
+            web_host, web_host_checked = await get_web_host(known, host) if addresses.address else (host, False)
+            if web_host != host:
+                addresses = await resolver.resolve_host(web_host)
+
+            # A resolver timeout isn't the host's fault, so nothing is recorded against it. It comes due
+            # again once its claim runs out.
+            if addresses.timed_out:
+                logger.info(f"Timed out resolving {host}, leaving it for a later ingest")
+                return False
+
+            # Now do database stuff.
+            instance = await get_or_save_host(session, host)
+            instance.last_ingest = datetime.datetime.utcnow()
+            instance.www_host = web_host
+            if web_host_checked:
+                instance.www_host_checked_at = instance.last_ingest
+            if not instance.digest:
+                instance.digest = sha256string(host)
+
+            if not instance.base_domain:
+                instance.base_domain = utils.get_safe_fld(host)
+
+            # The next ingest is booked now in case this one never finishes. Hosts that aren't known to
+            # work are booked as if this attempt fails.
+            if instance.last_ingest_status is None or instance.last_ingest_status in UNREADABLE_STATUSES:
+                schedule_next_ingest(instance, instance.consecutive_failures + 1)
+            else:
+                schedule_next_ingest(instance, 0)
 
-        if index_response.status_code == 530:
-            instance.last_ingest_status = "disabled"
             await session.commit()
-            logger.info(f"Host no longer has hosting {host} at {web_host}")
-            return False
 
-        # Robot blocks
-        if not www.can_crawl(f"https://{web_host}/"):
-            instance.last_ingest_status = "robots_blocked"
-            await clear_instance(session, instance)
+            if not addresses.address:
+                logger.info(f"No DNS for {host}")
+                instance.last_ingest_status = "no_dns"
+                await session.commit()
+                return False
+
+            instance.ip_address = addresses.ipv4
+            instance.ipv6_address = addresses.ipv6
+            await asn_lookup.load_known_prefixes(session)
+            asn_info = await networking.get_asn_data(addresses.address)
+            if asn_info:
+                instance.asn = asn_info.asn
+                await save_asn(session, asn_info)
+                logger.debug(f"ASN Saved for {host}")
+
+            # Add Reachability Check on port 443
+            index_response, index_contents = await networking.can_access_https(web_host)
+
+            if not index_response or not is_reachable(index_response, index_contents):
+                instance.last_ingest_status = "unreachable"
+                await session.commit()
+                logger.info(f"Unable to reach {host} as {web_host}")
+                return False
+
+            if index_response.status_code == 530:
+                instance.last_ingest_status = "disabled"
+                await session.commit()
+                logger.info(f"Host no longer has hosting {host} at {web_host}")
+                return False
+
+            # Robot blocks
+            if not await www.can_crawl(f"https://{web_host}/"):
+                instance.last_ingest_status = "robots_blocked"
+                await clear_instance(session, instance)
+                await session.commit()
+                logger.info(f"Host is blocked by robots.tx {host}")
+
+            # None of the remaining requests depend on each other, so they are all sent now and the
+            # processors pick up the responses as they go.
+            if settings.ingest_prefetch:
+                prefetch(instance)
+
+            nodeinfo = await get_instance_nodeinfo(instance, web_host)
+            if nodeinfo:
+                instance.nodeinfo_version = nodeinfo.version
+                await session.commit()
+
+            # Process with service specific function.
+            processor = await get_processor(nodeinfo)
+            if processor is not PROCESSORS["mastodon"]:
+                await www.close_prefetched()
+            if await processor(session, instance, nodeinfo):
+                await mark_success(session, instance)
+                return True
+
+            # Save whatever nodeinfo we have.
+            if nodeinfo and await PROCESSORS["nodeinfo"](session, instance, nodeinfo):
+                await mark_success(session, instance)
+                return True
+
+            instance.last_ingest_status = "unknown_service"
+            logger.info(f"Unable to process {host}")
             await session.commit()
-            logger.info(f"Host is blocked by robots.tx {host}")
+            return True
+        except asyncio.CancelledError:
+            # The ingest was stopped from outside, which `ingest_host` records once the session is rolled back.
+            cancelled = True
+            raise
+        except:
+            logger.exception(f"Unhandled error while processing host {host}.")
+            if instance:
+                instance.last_ingest_status = "crawl_error"
+                await session.commit()
+            raise
+        finally:
+            if instance and not cancelled:
+                await save_ingest_stats(session, instance, http)
+
+
+async def get_web_host(instance: Instance | None, host: str) -> Tuple[str, bool]:
+    """Returns the host that actually serves the instance, and whether host-meta was checked to find it.
+
+    The answer saved on the instance is reused until it expires. Hosts that didn't point anywhere else
+    expire sooner, since that is also what a failed host-meta lookup looks like.
+    """
+    if instance and instance.www_host and instance.www_host_checked_at:
+        if instance.www_host != host:
+            ttl = settings.host_meta_ttl_hours
+        else:
+            ttl = settings.host_meta_negative_ttl_hours
+        if instance.www_host_checked_at + datetime.timedelta(hours=ttl) > datetime.datetime.utcnow():
+            return instance.www_host, False
+    return await www.get_node_actual_host(host), True
+
+
+def prefetch(instance: Instance) -> None:
+    if has_fresh_nodeinfo_link(instance):
+        www.prefetch(cast(str, instance.nodeinfo_href))
+
+    # The software found last time is the best guess at which processor will run.
+    if not instance.software or instance.software not in PROCESSORS or instance.software == "mastodon":
+        mastodon.prefetch(instance)
+
+
+def has_fresh_nodeinfo_link(instance: Instance) -> bool:
+    if not instance.nodeinfo_href or not instance.nodeinfo_checked_at:
+        return False
+    expiration = instance.nodeinfo_checked_at + datetime.timedelta(hours=settings.nodeinfo_link_ttl_hours)
+    return expiration > datetime.datetime.utcnow()
+
 
-        nodeinfo = await get_nodeinfo(web_host)
+async def get_instance_nodeinfo(instance: Instance, web_host: str) -> NodeInfoInstance | None:
+    """Fetches the nodeinfo document, going straight to the saved link while it is still fresh.
+
+    The well-known discovery document is only requested again once the link expires or stops working.
+    """
+    if has_fresh_nodeinfo_link(instance):
+        nodeinfo = await get_nodeinfo_document(web_host, cast(str, instance.nodeinfo_href))
         if nodeinfo:
-            instance.nodeinfo_version = nodeinfo.version
-            await session.commit()
+            metrics.increment("nodeinfo.link_cache.hits")
+            return nodeinfo
+        metrics.increment("nodeinfo.link_cache.failures")
 
-        # Process with service specific function.
-        processor = await get_processor(nodeinfo)
-        if await processor(session, instance, nodeinfo):
-            await mark_success(session, instance)
-            return True
+    link = await get_nodeinfo_link(web_host)
+    instance.nodeinfo_href = link.href if link else None
+    instance.nodeinfo_schema = link.schema_version if link else None
+    instance.nodeinfo_checked_at = datetime.datetime.utcnow()
+    if not link:
+        return None
+    return await get_nodeinfo_document(web_host, link.href)
 
-        # Save whatever nodeinfo we have.
-        if nodeinfo and await PROCESSORS["nodeinfo"](session, instance, nodeinfo):
-            await mark_success(session, instance)
-            return True
 
-        instance.last_ingest_status = "unknown_service"
-        logger.info(f"Unable to process {host}")
+async def save_ingest_stats(session: AsyncSession, instance: Instance, http: www.HostSession) -> None:
+    try:
+        if http.latency_samples > 0:
+            instance.latency_average = http.latency_average
+            instance.latency_deviation = http.latency_deviation
+
+        if instance.last_ingest_status in UNREADABLE_STATUSES:
+            instance.consecutive_failures = (instance.consecutive_failures or 0) + 1
+            schedule_next_ingest(instance, instance.consecutive_failures)
+        elif instance.last_ingest_status:
+            instance.consecutive_failures = 0
+            schedule_next_ingest(instance, 0)
+        if instance.last_ingest_status and instance.last_ingest_status != "crawl_error":
+            quarantine.release(instance)
+            await www.save_validators(session, list(http.validators.values()))
+        instance.claimed_by = None
+        instance.lease_expires_at = None
+        instance.claimed_next_ingest_at = None
         await session.commit()
-        return True
     except:
-        logger.exception(f"Unhandled error while processing host {host}.")
-        if instance:
-            instance.last_ingest_status = "crawl_error"
-            await session.commit()
-        raise
+        logger.exception(f"Unable to save ingest stats for {instance.host}.")
+
+
+def schedule_next_ingest(instance: Instance, failures: int) -> None:
+    """Sets when the host should next be ingested, and why, for the scheduler to pick it up."""
+    if failures > 0:
+        instance.next_ingest_at = datetime.datetime.utcnow() + get_backoff(failures)
+        if failures >= settings.dormant_after_failures:
+            instance.ingest_priority = INGEST_PRIORITY_DORMANT
+        else:
+            instance.ingest_priority = INGEST_PRIORITY_UNREACHABLE
+        return
+
+    last_ingest = instance.last_ingest or datetime.datetime.utcnow()
+    instance.next_ingest_at = last_ingest + datetime.timedelta(hours=settings.stale_rescan_hours)
+    instance.ingest_priority = INGEST_PRIORITY_STALE
+
+
+def get_backoff(failures: int) -> datetime.timedelta:
+    """Returns how long to wait before trying a host again after a number of failures in a row.
+
+    The wait doubles with each failure up to a cap, with jitter so hosts that failed together spread
+    back out. Hosts that have failed long enough to be considered dead drop to a much slower schedule.
+    """
+    if failures >= settings.dormant_after_failures:
+        hours = settings.dormant_rescan_hours
+    else:
+        hours = min(
+            settings.unreachable_rescan_hours * 2 ** max(failures - 1, 0), settings.unreachable_backoff_max_hours
+        )
+    jitter = 1 + random.uniform(-settings.unreachable_backoff_jitter, settings.unreachable_backoff_jitter)
+    return datetime.timedelta(hours=hours * jitter)
 
 
 async def mark_success(session: Session, instance: Instance):
@@ -151,7 +386,7 @@ async def get_or_save_host(db: Session, host) -> Instance:
     return instance
 
 
-async def save_asn(session: Session, asn: cymruwhois.asrecord) -> None:
+async def save_asn(session: Session, asn: asn_lookup.ASNRecord) -> None:
     asn_insert_stmt = insert(ASN).values(
         [
             {
@@ -163,15 +398,16 @@ async def save_asn(session: Session, asn: cymruwhois.asrecord) -> None:
             }
         ]
     )
-    asn_update_statement = asn_insert_stmt.on_conflict_do_update(
-        index_elements=["asn"],
-        set_=dict(
-            cc=asn_insert_stmt.excluded.cc,
-            company=asn_insert_stmt.excluded.company,
-            owner=asn_insert_stmt.excluded.owner,
-            prefix=asn_insert_stmt.excluded.prefix,
-        ),
+    update_columns = dict(
+        cc=asn_insert_stmt.excluded.cc,
+        company=asn_insert_stmt.excluded.company,
+        owner=asn_insert_stmt.excluded.owner,
+        prefix=asn_insert_stmt.excluded.prefix,
     )
+    if not asn.owner:
+        # Records without an owner shouldn't erase the one already saved for the ASN.
+        update_columns = dict(prefix=asn_insert_stmt.excluded.prefix)
+    asn_update_statement = asn_insert_stmt.on_conflict_do_update(index_elements=["asn"], set_=update_columns)
     await session.execute(asn_update_statement)
     await session.commit()
 
@@ -184,7 +420,7 @@ def is_reachable(index_response: httpx.Response, index_contents: str | None):
         index_contents_lc = index_contents.lower()
         if "domain parking" in index_contents_lc:
             return False
-        if "ERR_NGROK_3200" in index_contents_lc:
+        if "err_ngrok_3200" in index_contents_lc:
             return False
 
     return True
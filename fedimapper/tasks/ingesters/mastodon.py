@@ -13,6 +13,7 @@ from fedimapper.models.instance import Instance, InstanceStats
 from fedimapper.services import db, mastodon
 from fedimapper.services.nodeinfo import NodeInfoInstance, NodeInfoUsers
 from fedimapper.services.stopwords import get_key_words
+from fedimapper.services.www import NotModified
 from fedimapper.settings import settings
 from fedimapper.tasks.ingesters import utils
 
@@ -32,10 +33,31 @@ async def save(session: Session, instance: Instance, nodeinfo: NodeInfoInstance
     return True
 
 
+def prefetch(instance: Instance) -> None:
+    """Starts every request `save` is going to make, so they're all in flight at once."""
+    mastodon.prefetch_metadata(instance.www_host, conditional=utils.was_saved(instance))
+    mastodon.prefetch_blocked_instances(instance.www_host, conditional=conditional_bans(instance))
+    # Peer lists that are only due some of the time are left to `save`.
+    if utils.peers_due(instance):
+        mastodon.prefetch_peers(instance.www_host, conditional=conditional_peers(instance))
+
+
+def conditional_bans(instance: Instance) -> bool:
+    return utils.was_saved(instance) and bool(instance.has_public_bans)
+
+
+def conditional_peers(instance: Instance) -> bool:
+    return utils.was_saved(instance) and bool(instance.has_public_peers)
+
+
 async def save_mastodon_metadata(session: Session, instance: Instance, nodeinfo: NodeInfoInstance | None) -> bool:
 
     try:
-        metadata = mastodon.get_metadata(instance.www_host)
+        metadata = await mastodon.get_metadata(instance.www_host, conditional=utils.was_saved(instance))
+    except NotModified:
+        # Only the metadata is unchanged- the nodeinfo fields and stats are still refreshed.
+        logger.debug(f"Instance metadata has not changed for {instance.host}")
+        metadata = None
     except httpx.TransportError as exc:
         instance.last_ingest_status = "unreachable"
         logger.info(f"Unable to reach host {instance.host} as {instance.www_host}")
@@ -45,15 +67,31 @@ async def save_mastodon_metadata(session: Session, instance: Instance, nodeinfo:
         logger.debug(f"Host is not Mastodon Compatible: {instance.host}")
         return False
 
-    instance.title = metadata.get("title", None)
-    instance.short_description = metadata.get("short_description", None)
-    instance.email = metadata.get("email", None)
-
     if nodeinfo:
         instance.version = nodeinfo.software.version
         instance.software_version = nodeinfo.software.version
         instance.software = nodeinfo.software.name
 
+    if metadata is not None:
+        apply_mastodon_metadata(instance, metadata, nodeinfo)
+
+    instance_stats = InstanceStats(
+        host=instance.host,
+        user_count=instance.current_user_count,
+        active_monthly_users=nodeinfo.usage.users.activeMonth if nodeinfo else None,
+        status_count=instance.current_status_count,
+        domain_count=instance.current_domain_count,
+    )
+    session.add(instance_stats)
+    await session.commit()
+    return True
+
+
+def apply_mastodon_metadata(instance: Instance, metadata: Dict[str, Any], nodeinfo: NodeInfoInstance | None) -> None:
+    instance.title = metadata.get("title", None)
+    instance.short_description = metadata.get("short_description", None)
+    instance.email = metadata.get("email", None)
+
     version_string = metadata.get("version", None)
     if version_string:
         instance.version = version_string
@@ -65,11 +103,9 @@ async def save_mastodon_metadata(session: Session, instance: Instance, nodeinfo:
                 instance.software_version = version_breakdown.software_version
 
     nodeinfo_total_users = None
-    nodeinfo_monthly_users = None
     nodeinfo_local_posts = None
     if nodeinfo:
         nodeinfo_total_users = nodeinfo.usage.users.total
-        nodeinfo_monthly_users = nodeinfo.usage.users.activeMonth
         nodeinfo_local_posts = nodeinfo.usage.localPosts
 
     instance.current_user_count = metadata.get("stats", {}).get("user_count", nodeinfo_total_users)
@@ -82,62 +118,66 @@ async def save_mastodon_metadata(session: Session, instance: Instance, nodeinfo:
         instance.registration_open = bool(reg_open)
     instance.approval_required = metadata.get("approval_required", None)
 
-    instance_stats = InstanceStats(
-        host=instance.host,
-        user_count=instance.current_user_count,
-        active_monthly_users=nodeinfo_monthly_users,
-        status_count=instance.current_status_count,
-        domain_count=instance.current_domain_count,
-    )
-    session.add(instance_stats)
-    await session.commit()
-    return True
-
 
 async def save_mastodon_blocked_instances(session: Session, instance: Instance):
     try:
         ingest_id = str(uuid4())
+        spam = utils.SpamTracker()
         # Will throw exceptions when the ban list isn't public.
-        banned = mastodon.get_blocked_instances(instance.www_host)
+        async for banned in mastodon.stream_blocked_instances(
+            instance.www_host, conditional=conditional_bans(instance)
+        ):
+            # Servers may list the same domain more than once, which an upsert can't handle in one statement.
+            banned_hosts = {x["domain"]: x for x in banned if x and x.get("domain", None)}
+            spam.add(banned_hosts.keys())
+            local_evils = spam.get_evils()
+
+            ban_values = [
+                {
+                    "host": instance.host,
+                    "banned_host": banned_host["domain"],
+                    "digest": banned_host["digest"],
+                    "ingest_id": ingest_id,
+                    "severity": banned_host["severity"],
+                    "comment": banned_host["comment"],
+                    # Servers in theory advertise a language, but they're mostly set to the default
+                    # of english regardless of what language the users and admins actually use.
+                    "keywords": list(get_key_words("en", banned_host["comment"])),
+                }
+                for banned_host in banned_hosts.values()
+                if not utils.is_evil(banned_host["domain"], local_evils)
+            ]
+
+            if len(ban_values) > 0:
+                ban_insert_stmt = insert(Ban)
+                ban_update_statement = ban_insert_stmt.on_conflict_do_update(
+                    index_elements=["host", "banned_host"],
+                    set_=dict(
+                        severity=ban_insert_stmt.excluded.severity,
+                        comment=ban_insert_stmt.excluded.comment,
+                        keywords=ban_insert_stmt.excluded.keywords,
+                        ingest_id=ban_insert_stmt.excluded.ingest_id,
+                    ),
+                )
+                ban_values.sort(key=lambda x: x["banned_host"])
+                await db.buffer_inserts(session, ban_update_statement, ban_values)
+
         instance.has_public_bans = True
 
-        local_evils = set(settings.evil_domains) | await utils.get_spammers_from_list([x["domain"] for x in banned])
-
-        ban_values = [
-            {
-                "host": instance.host,
-                "banned_host": banned_host["domain"],
-                "digest": banned_host["digest"],
-                "ingest_id": ingest_id,
-                "severity": banned_host["severity"],
-                "comment": banned_host["comment"],
-                # Servers in theory advertise a language, but they're mostly set to the default
-                # of english regardless of what language the users and admins actually use.
-                "keywords": list(get_key_words("en", banned_host["comment"])),
-            }
-            for banned_host in banned
-            if banned_host and len([suffix for suffix in local_evils if banned_host["domain"].endswith(suffix)]) == 0
-        ]
-
-        if len(ban_values) > 0:
-            ban_insert_stmt = insert(Ban)
-            ban_update_statement = ban_insert_stmt.on_conflict_do_update(
-                index_elements=["host", "banned_host"],
-                set_=dict(
-                    severity=ban_insert_stmt.excluded.severity,
-                    comment=ban_insert_stmt.excluded.comment,
-                    keywords=ban_insert_stmt.excluded.keywords,
-                    ingest_id=ban_insert_stmt.excluded.ingest_id,
-                ),
+        # Domains can cross the spam threshold after their first subdomains were already saved.
+        if spam.batches > 1 and len(spam.spammers) > 0:
+            ban_spam_stmt = delete(Ban).where(
+                and_(Ban.host == instance.host, utils.matches_domains(Ban.banned_host, spam.spammers))
             )
-            ban_values.sort(key=lambda x: x["banned_host"])
-            await db.buffer_inserts(session, ban_update_statement, ban_values)
+            await session.execute(ban_spam_stmt.execution_options(synchronize_session=False))
 
         ban_delete_stmt = delete(Ban).where(and_(Ban.host == instance.host, Ban.ingest_id != ingest_id))
         await session.execute(ban_delete_stmt)
         await session.commit()
 
-    except:
+    except NotModified:
+        logger.debug(f"Instance ban data has not changed for {instance.host}")
+    except utils.LIST_UNAVAILABLE_ERRORS:
         instance.has_public_bans = False
         ban_delete_stmt = delete(Ban).where(and_(Ban.host == instance.host))
         await session.execute(ban_delete_stmt)
@@ -149,12 +189,16 @@ async def save_mastodon_peered_instance(session: Session, instance: Instance):
     logger.info(f"Attempting to save peers: {instance.host}")
     try:
         # Will throw exceptions when the peer list isn't public.
-        peers = mastodon.get_peers(instance.www_host)
+        peers = mastodon.stream_peers(instance.www_host, conditional=conditional_peers(instance))
+        await utils.save_peer_batches(session, instance.host, peers)
         instance.has_public_peers = True
         instance.last_ingest_peers = datetime.datetime.utcnow()
         await session.commit()
-        await utils.save_peers(session, instance.host, peers)
-    except:
+    except NotModified:
+        instance.last_ingest_peers = datetime.datetime.utcnow()
+        await session.commit()
+        logger.debug(f"Instance peer data has not changed for {instance.host}")
+    except utils.LIST_UNAVAILABLE_ERRORS:
         instance.last_ingest_peers = datetime.datetime.utcnow()
         instance.has_public_peers = False
         await session.commit()
@@ -7,6 +7,7 @@ from sqlalchemy.orm import Session
 from fedimapper.models.instance import Instance
 from fedimapper.services import peertube
 from fedimapper.services.nodeinfo import NodeInfoInstance, NodeInfoUsers
+from fedimapper.services.www import NotModified
 from fedimapper.tasks.ingesters import utils
 from fedimapper.tasks.ingesters.nodeinfo import save_nodeinfo_stats
 
@@ -35,7 +36,11 @@ async def save(session: Session, instance: Instance, nodeinfo: NodeInfoInstance
 async def save_peertube_metadata(session: Session, instance: Instance, nodeinfo: NodeInfoInstance | None) -> bool:
 
     try:
-        metadata = peertube.get_metadata(instance.www_host)
+        metadata = await peertube.get_metadata(instance.www_host, conditional=utils.was_saved(instance))
+    except NotModified:
+        # Only the config is unchanged- the stats and admin details still need to be requested.
+        logger.debug(f"Instance metadata has not changed for {instance.host}")
+        metadata = None
     except httpx.TransportError as exc:
         instance.last_ingest_status = "unreachable"
         logger.info(f"Unable to reach host {instance.host} as {instance.www_host}")
@@ -47,16 +52,17 @@ async def save_peertube_metadata(session: Session, instance: Instance, nodeinfo:
 
     instance.software = "peertube"
 
-    instance_config = metadata.get("instance", {})
-    instance.title = instance_config.get("name", None)
-    instance.short_description = instance_config.get("shortDescription", None)
+    if metadata is not None:
+        instance_config = metadata.get("instance", {})
+        instance.title = instance_config.get("name", None)
+        instance.short_description = instance_config.get("shortDescription", None)
 
-    instance_signup = metadata.get("signup", {})
-    instance.registration_open = instance_signup.get("allowed", None)
+        instance_signup = metadata.get("signup", {})
+        instance.registration_open = instance_signup.get("allowed", None)
 
-    version = metadata.get("serverVersion", None)
-    instance.version = version
-    instance.software_version = version
+        version = metadata.get("serverVersion", None)
+        instance.version = version
+        instance.software_version = version
 
     try:
         user_count = None
@@ -70,14 +76,14 @@ async def save_peertube_metadata(session: Session, instance: Instance, nodeinfo:
             instance.user_count = user_count
             instance.status_count = status_count
         else:
-            stats = peertube.get_stats(instance.www_host)
+            stats = await peertube.get_stats(instance.www_host)
             instance.user_count = stats.get("totalUsers", None)
             instance.status_count = stats.get("totalVideos", None)
     except httpx.TransportError as exc:
         pass
 
     try:
-        about = peertube.get_about(instance.www_host)
+        about = await peertube.get_about(instance.www_host)
         instance.email = about.get("admin", {}).get("email", None)
     except httpx.TransportError as exc:
         pass
@@ -89,14 +95,18 @@ async def save_peertube_metadata(session: Session, instance: Instance, nodeinfo:
 async def save_peertube_peered_instance(session: Session, instance: Instance) -> bool:
     try:
         # Will throw exceptions when the peer list isn't public.
-        peers_full = peertube.get_peers(instance.www_host)
+        conditional = utils.was_saved(instance) and bool(instance.has_public_peers)
+        peers_full = await peertube.get_peers(instance.www_host, conditional=conditional)
         instance.domain_count = peers_full.get("total", None)
         instance.has_public_peers = True
         await session.commit()
         peers = set([x["follower"]["host"] for x in peers_full.get("data", [])])
         await utils.save_peers(session, instance.host, peers)
         return True
-    except:
+    except NotModified:
+        logger.debug(f"Instance peer data has not changed for {instance.host}")
+        return True
+    except utils.LIST_UNAVAILABLE_ERRORS:
         instance.has_public_peers = False
         await session.commit()
         logger.exception(f"Unable to get instance peer data for {instance.host}")
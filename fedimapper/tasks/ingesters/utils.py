@@ -1,10 +1,12 @@
 import datetime
 import random
+from collections import Counter
 from logging import getLogger
-from typing import List, Set
+from typing import Any, AsyncIterator, Iterable, List, Set
 from uuid import uuid4
 
-from sqlalchemy import and_, delete
+import httpx
+from sqlalchemy import and_, delete, or_, select
 from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import Session
 from tld import get_tld
@@ -13,10 +15,15 @@ from fedimapper.models.evil import Evil
 from fedimapper.models.instance import Instance
 from fedimapper.models.peer import Peer
 from fedimapper.services.db import DB_MODE, DB_MODE_SQLITE, buffer_inserts
+from fedimapper.services.www import WWWException
 from fedimapper.settings import settings
 
 logger = getLogger(__name__)
 
+# Ways a host can fail to hand over a list: refused, unreachable, too large or slow, or not valid JSON.
+# Anything else, including database errors and cancellation, propagates so saved data is left alone.
+LIST_UNAVAILABLE_ERRORS = (WWWException, httpx.HTTPError, ValueError, KeyError)
+
 
 def get_safe_fld(domain: str):
     # If there are only two parts it has to be a full domain already.
@@ -35,15 +42,47 @@ def get_safe_fld(domain: str):
     return domain
 
 
+class SpamTracker:
+    """Counts how many hosts share each registered domain, as domains with huge numbers of subdomains are spam.
+
+    Counts are kept as hosts are added, so long lists can be checked a batch at a time.
+    """
+
+    def __init__(self):
+        self.domain_count: Counter = Counter()
+        self.spammers: Set[str] = set()
+        self.batches = 0
+
+    def add(self, hosts: Iterable[str]) -> None:
+        self.batches += 1
+        for host in hosts:
+            fld = get_safe_fld(host)
+            self.domain_count[fld] += 1
+            if self.domain_count[fld] >= settings.spam_domain_threshold:
+                self.spammers.add(fld)
+
+    def get_evils(self) -> Set[str]:
+        return set(settings.evil_domains) | self.spammers
+
+
+def is_evil(host: str, evils: Set[str]) -> bool:
+    return len([suffix for suffix in evils if host.endswith(suffix)]) > 0
+
+
+def matches_domains(column, domains: Set[str]):
+    # Matches the domains themselves and any of their subdomains.
+    conditions = []
+    for domain in domains:
+        escaped = domain.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conditions.append(column == domain)
+        conditions.append(column.like(f"%.{escaped}", escape="\\"))
+    return or_(*conditions)
+
+
 async def get_spammers_from_list(hosts: List[str] | Set[str]):
-    domain_count = {}
-    for host in hosts:
-        fld = get_safe_fld(host)
-        if not fld in domain_count:
-            domain_count[fld] = 1
-        else:
-            domain_count[fld] += 1
-    return set([domain for domain, count in domain_count.items() if count >= settings.spam_domain_threshold])
+    tracker = SpamTracker()
+    tracker.add(hosts)
+    return tracker.spammers
 
 
 async def save_evil_domains(session: Session, domains: List[str] | Set[str]):
@@ -57,37 +96,64 @@ async def save_evil_domains(session: Session, domains: List[str] | Set[str]):
 
 
 async def save_peers(session: Session, host: str, peers: Set[str]):
+    await save_peer_batches(session, host, single_batch(sorted(peers)))
+
 
-    sorted_peers: List[str] = sorted(peers)
+async def single_batch(items: List[Any]) -> AsyncIterator[List[Any]]:
+    yield items
+
+
+async def save_peer_batches(session: Session, host: str, batches: AsyncIterator[List[str]]):
+    """Saves peers as they are downloaded, so the full list never has to be held in memory.
+
+    Args:
+        session (Session): Database session.
+        host (str): The host the peers were pulled from.
+        batches (AsyncIterator[List[str]]): Batches of peer hosts.
+    """
     ingest_id = str(uuid4())
-    local_evils = set(settings.evil_domains) | await get_spammers_from_list(sorted_peers)
-    insert_peer_values = [
-        {
-            "host": host,
-            "peer_host": peer_host,
-            "ingest_id": ingest_id,
-        }
-        for peer_host in sorted_peers
-        if peer_host and len([suffix for suffix in local_evils if peer_host.endswith(suffix)]) == 0
-    ]
-
-    if len(insert_peer_values) > 0:
-        # Add Peers to Instances for future processing.
-        # This also has to have before the peer relationship itself due to foreign keys.
-        insert_instance_values = [
+    spam = SpamTracker()
+
+    async for batch in batches:
+        sorted_peers: List[str] = sorted(set([x for x in batch if isinstance(x, str)]))
+        spam.add(sorted_peers)
+        local_evils = spam.get_evils()
+        insert_peer_values = [
             {
-                "host": peer_host["peer_host"],
-                "base_domain": get_safe_fld(peer_host["peer_host"]),
+                "host": host,
+                "peer_host": peer_host,
+                "ingest_id": ingest_id,
             }
-            for peer_host in insert_peer_values
+            for peer_host in sorted_peers
+            if peer_host and not is_evil(peer_host, local_evils)
         ]
 
-        insert_instance_stmt = insert(Instance)
-        insert_instance_conflict_stmt = insert_instance_stmt.on_conflict_do_nothing(index_elements=["host"])
-        await buffer_inserts(session, insert_instance_conflict_stmt, insert_instance_values)
-
-        insert_peer_stmt = insert(Peer).on_conflict_do_nothing(index_elements=["host", "peer_host"])
-        await buffer_inserts(session, insert_peer_stmt, insert_peer_values)
+        if len(insert_peer_values) > 0:
+            # Add Peers to Instances for future processing.
+            # This also has to have before the peer relationship itself due to foreign keys.
+            insert_instance_values = [
+                {
+                    "host": peer_host["peer_host"],
+                    "base_domain": get_safe_fld(peer_host["peer_host"]),
+                }
+                for peer_host in insert_peer_values
+            ]
+
+            insert_instance_stmt = insert(Instance)
+            insert_instance_conflict_stmt = insert_instance_stmt.on_conflict_do_nothing(index_elements=["host"])
+            await buffer_inserts(session, insert_instance_conflict_stmt, insert_instance_values)
+
+            # Existing peers have to be tagged with this ingest or the cleanup below would remove them.
+            insert_peer_stmt = insert(Peer)
+            insert_peer_update_stmt = insert_peer_stmt.on_conflict_do_update(
+                index_elements=["host", "peer_host"],
+                set_=dict(ingest_id=insert_peer_stmt.excluded.ingest_id),
+            )
+            await buffer_inserts(session, insert_peer_update_stmt, insert_peer_values)
+
+    # Domains can cross the spam threshold after their first subdomains were already saved.
+    if spam.batches > 1 and len(spam.spammers) > 0:
+        await remove_spam_peers(session, host, spam.spammers)
 
     # Delete old relationships that weren't in this ingest.
     peer_delete_stmt = delete(Peer).where(and_(Peer.host == host, Peer.ingest_id != ingest_id))
@@ -95,16 +161,44 @@ async def save_peers(session: Session, host: str, peers: Set[str]):
     await session.commit()
 
 
-async def should_save_peers(instance: Instance) -> bool:
+async def remove_spam_peers(session: Session, host: str, spammers: Set[str]):
+    peer_delete_stmt = delete(Peer).where(and_(Peer.host == host, matches_domains(Peer.peer_host, spammers)))
+    await session.execute(peer_delete_stmt.execution_options(synchronize_session=False))
+
+    # Drop the instances that were only added because of this list.
+    instance_delete_stmt = delete(Instance).where(
+        and_(
+            Instance.base_domain.in_(spammers),
+            Instance.last_ingest == None,
+            Instance.host.not_in(select(Peer.peer_host)),
+        )
+    )
+    await session.execute(instance_delete_stmt.execution_options(synchronize_session=False))
+    await session.commit()
+
+
+def was_saved(instance: Instance) -> bool:
+    # Unchanged responses can only be skipped when the last ingest actually saved them.
+    return instance.last_ingest_status == "success"
+
+
+def peers_due(instance: Instance) -> bool:
     if not instance.last_ingest_peers:
         return True
 
+    # If older than X hours return True.
     peer_age = (datetime.datetime.utcnow() - instance.last_ingest_peers).total_seconds()
+    return peer_age > 3600 * settings.refresh_peers_hours
 
-    # If older than X hours return True.
-    if peer_age > 3600 * settings.refresh_peers_hours:
+
+async def should_save_peers(instance: Instance) -> bool:
+    if peers_due(instance):
         return True
 
+    if not instance.last_ingest_peers:
+        return False
+    peer_age = (datetime.datetime.utcnow() - instance.last_ingest_peers).total_seconds()
+
     # If older than X/2 hours randomly return true.
     # This skews peer lookups so they don't all happen at once.
     if peer_age > 3600 * settings.refresh_peers_hours / 2:
@@ -0,0 +1,5 @@
+# Imported by the forkserver before it forks any workers, so each one starts with the ingest code and data
+# already loaded rather than importing and reading it all again.
+from fedimapper.tasks import ingest
+
+ingest.warm_up()
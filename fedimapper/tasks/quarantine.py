@@ -0,0 +1,90 @@
+import datetime
+from logging import getLogger
+from typing import List, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fedimapper.models.instance import INGEST_PRIORITY_QUARANTINED, Instance
+from fedimapper.settings import settings
+from fedimapper.utils import metrics
+
+logger = getLogger(__name__)
+
+# Ways an ingest can fail that say more about the host than about whether it is up.
+CRASH = "crash"
+TIMEOUT = "timeout"
+
+
+def was_abandoned(
+    claimed_by: str | None, lease_expires_at: datetime.datetime | None, last_ingest: datetime.datetime | None
+) -> bool:
+    """Returns whether a claimed host had its ingest started but never finished.
+
+    Finishing an ingest clears the claim, so a host that is due again while still claimed, and that was
+    ingested after it was claimed, took down the worker running it. Hosts whose claim simply ran out
+    before a worker got to them aren't counted against them.
+    """
+    if not claimed_by or not lease_expires_at or not last_ingest:
+        return False
+    return last_ingest >= lease_expires_at - datetime.timedelta(seconds=settings.ingest_lease_seconds)
+
+
+def count_failure(instance: Instance, kind: str) -> bool:
+    """Counts a crash or timeout against a host, and quarantines it once it has too many.
+
+    Returns whether the host is now quarantined.
+    """
+    if kind == CRASH:
+        instance.crash_count = (instance.crash_count or 0) + 1
+    else:
+        instance.timeout_count = (instance.timeout_count or 0) + 1
+    metrics.increment(f"quarantine.{kind}")
+
+    if (instance.crash_count or 0) + (instance.timeout_count or 0) < settings.quarantine_after_failures:
+        return False
+    quarantine(instance)
+    return True
+
+
+def quarantine(instance: Instance) -> None:
+    """Holds the host back for a long time, after which it is only ever ingested in isolation."""
+    instance.quarantined_until = datetime.datetime.utcnow() + datetime.timedelta(hours=settings.quarantine_hours)
+    instance.next_ingest_at = instance.quarantined_until
+    instance.ingest_priority = INGEST_PRIORITY_QUARANTINED
+    metrics.increment("quarantine.quarantined")
+    logger.warning(
+        f"Quarantining {instance.host} until {instance.quarantined_until} after {instance.crash_count} crashes "
+        f"and {instance.timeout_count} timeouts."
+    )
+
+
+def release(instance: Instance) -> None:
+    """Clears the host's record once an ingest of it finishes normally."""
+    instance.crash_count = 0
+    instance.timeout_count = 0
+    instance.quarantined_until = None
+
+
+async def record_failure(session: AsyncSession, host: str, kind: str) -> bool:
+    """Marks the host's last ingest as failed and counts it, returning whether the host is now quarantined.
+
+    The caller commits.
+    """
+    instance = await session.get(Instance, host)
+    if not instance:
+        return False
+    instance.last_ingest_status = "crawl_timeout" if kind == TIMEOUT else "crawl_error"
+    instance.claimed_by = None
+    instance.lease_expires_at = None
+    instance.claimed_next_ingest_at = None
+    return count_failure(instance, kind)
+
+
+async def record_abandoned(session: AsyncSession, hosts: List[str]) -> Set[str]:
+    """Counts a crash against each host whose last ingest never finished, returning those now quarantined."""
+    quarantined = set()
+    for host in hosts:
+        logger.warning(f"The last ingest of {host} never finished.")
+        if await record_failure(session, host, CRASH):
+            quarantined.add(host)
+    return quarantined
@@ -0,0 +1,75 @@
+import json
+from typing import Any, Callable, Dict
+
+# Native JSON libraries are used when they're installed (`pip install fedimapper[speedups]`), with the
+# standard library as the fallback. Both have to agree on the output, so the fast paths fall back to
+# the standard library for anything they won't handle the same way.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None  # type: ignore
+
+
+def stdlib_loads(data: bytes | str) -> Any:
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    # Plenty of servers put raw control characters in their strings, which strict parsing rejects.
+    return json.loads(data, strict=False)
+
+
+def stdlib_dumps(content: Any) -> bytes:
+    # Matches the output of Starlette's JSONResponse.
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def orjson_loads(data: bytes | str) -> Any:
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return stdlib_loads(data)
+
+
+def orjson_dumps(content: Any) -> bytes:
+    try:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        return stdlib_dumps(content)
+
+
+def msgspec_loads(data: bytes | str) -> Any:
+    try:
+        return msgspec.json.decode(data)
+    except msgspec.DecodeError:
+        return stdlib_loads(data)
+
+
+def msgspec_dumps(content: Any) -> bytes:
+    try:
+        return msgspec.json.encode(content)
+    except TypeError:
+        return stdlib_dumps(content)
+
+
+BACKENDS: Dict[str, Dict[str, Callable]] = {"json": {"loads": stdlib_loads, "dumps": stdlib_dumps}}
+if msgspec:
+    BACKENDS["msgspec"] = {"loads": msgspec_loads, "dumps": msgspec_dumps}
+if orjson:
+    BACKENDS["orjson"] = {"loads": orjson_loads, "dumps": orjson_dumps}
+
+
+def get_backend_name() -> str:
+    for name in ["orjson", "msgspec"]:
+        if name in BACKENDS:
+            return name
+    return "json"
+
+
+backend = get_backend_name()
+loads: Callable[[bytes | str], Any] = BACKENDS[backend]["loads"]
+dumps: Callable[[Any], bytes] = BACKENDS[backend]["dumps"]
@@ -0,0 +1,90 @@
+import codecs
+import json
+from typing import Any, List
+
+WHITESPACE = " \t\n\r\ufeff"
+DELIMITERS = WHITESPACE + ",]"
+
+
+class JSONStreamException(ValueError):
+    pass
+
+
+class JSONArrayParser:
+    """Parses the items of a top level JSON array as the bytes arrive.
+
+    Only the item currently being read is held in memory, so the size of the whole document doesn't
+    matter- only the size of its largest item.
+    """
+
+    def __init__(self, max_item_size: int = 1024 * 1024):
+        self.decoder = json.JSONDecoder(strict=False)
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.max_item_size = max_item_size
+        self.buffer = ""
+        self.started = False
+        self.finished = False
+        self.expecting_value = True
+
+    def feed(self, data: bytes) -> List[Any]:
+        self.buffer += self.text_decoder.decode(data)
+        return self.parse(final=False)
+
+    def close(self) -> List[Any]:
+        self.buffer += self.text_decoder.decode(b"", final=True)
+        items = self.parse(final=True)
+        if not self.finished:
+            raise JSONStreamException("Document ended before the JSON array was closed.")
+        return items
+
+    def parse(self, final: bool) -> List[Any]:
+        items = []
+        buffer = self.buffer
+        length = len(buffer)
+        position = 0
+
+        while position < length and not self.finished:
+            char = buffer[position]
+            if char in WHITESPACE:
+                position += 1
+                continue
+
+            if not self.started:
+                if char != "[":
+                    raise JSONStreamException("Document is not a JSON array.")
+                self.started = True
+                position += 1
+                continue
+
+            if char == "]":
+                self.finished = True
+                position += 1
+                continue
+
+            if not self.expecting_value:
+                if char != ",":
+                    raise JSONStreamException(f"Unexpected character {char!r} between array items.")
+                self.expecting_value = True
+                position += 1
+                continue
+
+            try:
+                item, end = self.decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as exc:
+                if final:
+                    raise JSONStreamException(str(exc)) from exc
+                break
+
+            # A number that runs up to the end of the buffer may still be missing digits, a decimal or
+            # an exponent. It is only complete once the next delimiter has arrived.
+            if not final and (end >= length or buffer[end] not in DELIMITERS):
+                break
+
+            items.append(item)
+            self.expecting_value = False
+            position = end
+
+        self.buffer = buffer[position:]
+        if len(self.buffer) > self.max_item_size:
+            raise JSONStreamException(f"JSON array item is larger than {self.max_item_size} characters.")
+        return items
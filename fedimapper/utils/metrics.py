@@ -0,0 +1,71 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from logging import getLogger
+from typing import Dict, Iterator
+
+logger = getLogger(__name__)
+
+# Metrics are kept per process- each worker reports its own numbers through the logs.
+counters: Dict[str, float] = defaultdict(float)
+gauges: Dict[str, float] = {}
+timers: Dict[str, Dict[str, float]] = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0})
+last_logged = time.monotonic()
+
+
+def increment(name: str, value: float = 1) -> None:
+    counters[name] += value
+
+
+def set_gauge(name: str, value: float) -> None:
+    gauges[name] = value
+
+
+def observe(name: str, seconds: float) -> None:
+    timer = timers[name]
+    timer["count"] += 1
+    timer["total"] += seconds
+    timer["max"] = max(timer["max"], seconds)
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def reset() -> None:
+    counters.clear()
+    gauges.clear()
+    timers.clear()
+
+
+def ratio(numerator: str, denominator: str) -> float:
+    if not counters[denominator]:
+        return 0.0
+    return counters[numerator] / counters[denominator]
+
+
+def snapshot() -> Dict[str, float]:
+    results = dict(counters)
+    results.update(gauges)
+    for name, timer in timers.items():
+        results[f"{name}.count"] = timer["count"]
+        results[f"{name}.avg"] = timer["total"] / timer["count"] if timer["count"] else 0.0
+        results[f"{name}.max"] = timer["max"]
+    return dict(sorted(results.items()))
+
+
+def log_metrics(prefix: str = "") -> None:
+    global last_logged
+    last_logged = time.monotonic()
+    for name, value in snapshot().items():
+        logger.info(f"{prefix}{name}={value:.4f}")
+
+
+def log_metrics_periodically(interval: float, prefix: str = "") -> None:
+    if time.monotonic() - last_logged >= interval:
+        log_metrics(prefix)
@@ -1,26 +1,48 @@
 import asyncio
+import importlib
 import inspect
 import logging
+import math
 import multiprocessing as mp
 import signal
+import sys
 import time
 from queue import Empty, Full
-from typing import Callable
+from typing import Any, Awaitable, Callable, List, Tuple
 
 import psutil
 from pydantic import BaseSettings
 
+from fedimapper.utils import metrics
+
 
 class Settings(BaseSettings):
     num_processes: int = 2
+    concurrency: int = 1
     max_queue_size: int = 300
+    worker_queue_size: int | None = None
     prevent_requeuing_time: float = 300
-    empty_queue_sleep_time: float = 1.00
-    full_queue_sleep_time: float = 5.00
+    no_work_sleep_time: float = 5.00
     queue_interaction_timeout: float = 0.01
+    queue_get_timeout: float = 1.00
+    queue_low_watermark: float = 0.3
+    demand_wait_timeout: float = 1.00
     graceful_shutdown_timeout: float = 30
     lookup_block_size: int = 10
+    limited_lookup_multiplier: int = 3
     max_jobs_per_process: int | None = 200
+    metrics_log_interval: float = 300
+    start_method: str | None = None
+    preload_modules: List[str] = []
+    min_processes: int | None = None
+    max_processes: int | None = None
+    autoscale_interval: float = 60
+    autoscale_scale_up_lag: float = 600
+    autoscale_scale_down_lag: float = 60
+    autoscale_busy_utilization: float = 0.75
+    autoscale_idle_utilization: float = 0.25
+    autoscale_max_cpu_percent: float = 85
+    autoscale_max_memory_percent: float = 85
 
 
 def get_named_settings(name):
@@ -31,51 +53,151 @@ def get_named_settings(name):
     return QueueSettings()
 
 
+def get_queue_size(queue) -> int:
+    # Native queues can't report their size on some platforms (macOS)- treat them as empty and let
+    # puts against a full queue fail instead.
+    try:
+        return queue.qsize()
+    except NotImplementedError:
+        return 0
+
+
+def get_scaling_decision(
+    settings: Settings,
+    workers: int,
+    in_flight: int,
+    backlog_age: float | None,
+    cpu_percent: float,
+    memory_percent: float,
+) -> Tuple[int, str]:
+    """Returns how many workers to add (or remove, when negative) and why.
+
+    The pool grows when work is overdue and the workers already have most of their slots filled, as
+    long as the machine has room for another process. It shrinks when the machine is short on CPU or
+    memory, or when nothing is overdue and most slots sit empty.
+    """
+    min_processes = settings.min_processes or settings.num_processes
+    max_processes = settings.max_processes or settings.num_processes
+    utilization = in_flight / (workers * settings.concurrency) if workers > 0 else 1.0
+
+    if cpu_percent > settings.autoscale_max_cpu_percent or memory_percent > settings.autoscale_max_memory_percent:
+        if workers > min_processes:
+            return -1, f"resource pressure (cpu {cpu_percent:.0f}%, memory {memory_percent:.0f}%)"
+        return 0, "resource pressure at minimum size"
+
+    if backlog_age is not None and backlog_age > settings.autoscale_scale_up_lag:
+        if utilization >= settings.autoscale_busy_utilization and workers < max_processes:
+            return 1, f"backlog {backlog_age:.0f}s old with {utilization:.0%} of slots busy"
+        return 0, "backlog without busy workers or at maximum size"
+
+    if (backlog_age is None or backlog_age < settings.autoscale_scale_down_lag) and workers > min_processes:
+        if utilization < settings.autoscale_idle_utilization:
+            return -1, f"no backlog with {utilization:.0%} of slots busy"
+
+    return 0, "steady"
+
+
+def get_main_modules() -> List[str]:
+    # Programs run with `python -m` are only preloaded by the forkserver when named as a module.
+    spec = getattr(sys.modules["__main__"], "__spec__", None)
+    if spec and spec.name:
+        return [spec.name]
+    return ["__main__"]
+
+
+class Worker:
+    """A worker process along with its queue and the shared values used to watch and retire it."""
+
+    def __init__(self, process, queue, in_flight, retire):
+        self.process = process
+        self.queue = queue
+        self.in_flight = in_flight
+        self.retire = retire
+
+    def is_accepting(self) -> bool:
+        return self.process.is_alive() and not self.retire.is_set()
+
+
+class WorkerQueues:
+    """Hands each id to the queue of the worker with the least work waiting.
+
+    Every worker reads from a queue of its own. A shared queue is read under a lock that every worker
+    takes while it waits for work, so a worker killed while waiting would leave it held and starve the
+    rest. With a queue each, a worker that dies only takes its own queue down with it.
+    """
+
+    def __init__(self, workers: List[Worker]):
+        self.workers = workers
+
+    def put(self, id, block=True, timeout=None):
+        accepting = [x for x in self.workers if x.is_accepting()]
+        if not accepting:
+            raise Full
+        worker = min(accepting, key=lambda x: get_queue_size(x.queue))
+        worker.queue.put(id, block, timeout)
+
+    def qsize(self) -> int:
+        return sum(get_queue_size(x.queue) for x in self.workers if x.is_accepting())
+
+
 class QueueBuilder:
-    def __init__(self, queue, settings, writer):
+    def __init__(self, queue, settings, writer, limiter=None, release=None):
         self.i = 0
         self.queue = queue
         self.settings = settings
         self.last_queued = {}
         self.writer = writer
+        self.limiter = limiter
+        self.release = release
+        self.pending = []
         self.closed = False
 
-    async def populate(self, max=50):
-
-        self.clean_history()
-
-        # Writers can be expensive but cheaper when pulling bulk records.
-        queue_size = self.queue.qsize()
-        if queue_size >= self.settings.max_queue_size * 0.3:
-            return True
-
+    def get_capacity(self) -> int:
         # Don't try to fill the queue 100% since the queue size isn't always accurate.
-        count = min(int(self.settings.max_queue_size * 0.8) - queue_size, max)
-        blocksize = min(self.settings.lookup_block_size, count)
-        if count <= 0:
-            logging.debug("Skipping queue population due to max queue size.")
-            return False
-        try:
-            successful_adds = 0
+        return max(int(self.settings.max_queue_size * 0.8) - get_queue_size(self.queue), 0)
+
+    async def fetch(self) -> List:
+        """Pulls the next block of ids from the writer, without queuing them."""
+        # When a limiter is holding some ids back pull extra so there is other work to hand out instead.
+        blocksize = self.settings.lookup_block_size
+        desired = blocksize * self.settings.limited_lookup_multiplier if self.limiter else blocksize
+        ids = []
+        async for id in self.writer(desired=desired):
+            if id is None or id is False:
+                break
+            ids.append(id)
+        return ids
 
-            # If the queue is closed tell the children processes to close.
-            if self.closed:
-                for i in range(0, blocksize):
-                    self.queue.put("close", True, self.settings.queue_interaction_timeout)
-                return False
+    async def enqueue(self, ids: List) -> int:
+        """Queues as many of the pending ids and these new ones as there is room for.
 
-            async for id in self.writer(desired=blocksize):
-                if id is None or id is False:
-                    logging.debug(f"Returning False {id}")
-                    return False
+        Ids that don't fit stay pending for the next call. Writers that claim the ids they hand out get
+        back any that are skipped, along with how long the limiter expects to hold each of them back.
+        """
+        self.clean_history()
+        self.pending.extend(ids)
+        capacity = self.get_capacity()
+        added = 0
+        skipped = []
+        delays = {}
+        while self.pending and added < capacity:
+            id = self.pending.pop(0)
+            try:
                 if self.add_to_queue(id):
                     logging.debug(f"Added {id} to queue.")
-                    successful_adds += 1
-                    if successful_adds >= max:
-                        return True
-        except Full:
-            logging.debug("Queue has reached max size.")
-            return False
+                    added += 1
+                else:
+                    skipped.append(id)
+                    if self.limiter:
+                        delays[id] = self.limiter.get_wait(id)
+            except Full:
+                logging.debug("Queue has reached max size.")
+                self.pending.insert(0, id)
+                break
+
+        if skipped and self.release:
+            await self.release(skipped, delays)
+        return added
 
     def add_to_queue(self, id):
         if id in self.last_queued:
@@ -87,11 +209,20 @@ class QueueBuilder:
             if self.last_queued[id] + self.settings.prevent_requeuing_time > time.time():
                 logging.debug(f"Skipping {id}: added too recently.")
                 return False
+        if self.limiter and not self.limiter.acquire(id):
+            logging.debug(f"Skipping {id}: rate limited.")
+            return False
         logging.debug(f"Adding {id} to queue.")
-        self.last_queued[id] = time.time()
         self.queue.put(id, True, self.settings.queue_interaction_timeout)
+        self.last_queued[id] = time.time()
         return True
 
+    def requeue(self, ids: List):
+        """Puts ids that were queued but never taken back at the front of the line."""
+        for id in ids:
+            self.last_queued.pop(id, None)
+        self.pending[:0] = ids
+
     def clean_history(self):
         self.last_queued = {
             k: v for k, v in self.last_queued.items() if v + self.settings.prevent_requeuing_time > time.time()
@@ -103,93 +234,262 @@ class QueueBuilder:
 
 
 class QueueRunner(object):
-    def __init__(self, name: str, reader: Callable, writer: Callable, settings: Settings | None = None, **kwargs):
+    def __init__(
+        self,
+        name: str,
+        reader: Callable,
+        writer: Callable,
+        settings: Settings | None = None,
+        limiter: Any = None,
+        release: Callable | None = None,
+        backlog: Callable[[], Awaitable[float | None]] | None = None,
+        **kwargs,
+    ):
         self.name = name
         self.settings = settings if settings else get_named_settings(name)
         self.reader = reader
         self.writer = writer
+        self.limiter = limiter
+        self.release = release
+        self.backlog = backlog
         self.worker_launches = 0
+        # Typed loosely, as the stubs for the default context don't include Process.
+        self.context: Any = mp.get_context(self.settings.start_method)
+
+        # Preloaded modules are imported once, before any worker starts, so replacing a worker doesn't mean
+        # importing and loading everything again. A forkserver also preloads the main module, which its
+        # children would otherwise each import for themselves.
+        if self.context.get_start_method() == "forkserver":
+            self.context.set_forkserver_preload(get_main_modules() + self.settings.preload_modules)
+        elif self.context.get_start_method() == "fork":
+            for module in self.settings.preload_modules:
+                importlib.import_module(module)
+        self.target_processes = self.settings.num_processes
+        self.last_scaled = time.monotonic()
+
+        # The queue is split between the workers, sized for the most the pool can grow to.
+        self.worker_queue_size = self.settings.worker_queue_size or math.ceil(
+            self.settings.max_queue_size / (self.settings.max_processes or self.settings.num_processes)
+        )
 
     async def main(self):
-        with mp.Manager() as manager:
-            import_queue = manager.Queue(self.settings.max_queue_size)
-            queue_builder = QueueBuilder(import_queue, self.settings, self.writer)
-            shutdown_event = manager.Event()
-
-            # Inline function to implicitly pass through shutdown_event.
-            def shutdown(a=None, b=None):
-                if a != None:
-                    logging.debug(f"Signal {a} caught.")
-
-                # Send shutdown signal to all processes.
-                shutdown_event.set()
-
-                # Graceful shutdown- wait for children to shut down.
-                if a == 15 or a == None:
-                    logging.debug("Gracefully shutting down child processes.")
-                    shutdown_start = time.time()
-                    while len(psutil.Process().children()) > 0:
-                        if time.time() > (shutdown_start + self.settings.graceful_shutdown_timeout):
-                            break
-                        time.sleep(0.05)
-
-                # Kill any remaining processes directly, not counting on variables.
-                remaining_processes = psutil.Process().children()
-                if len(remaining_processes) > 0:
-                    logging.debug("Terminating remaining child processes.")
-                    for process in remaining_processes:
-                        process.terminate()
-
-            # Set shutdown function as signal handler for SIGINT and SIGTERM.
-            signal.signal(signal.SIGINT, shutdown)
-            signal.signal(signal.SIGTERM, shutdown)
-
-            # Now start actual script.
-            try:
-                processes = []
-                while not shutdown_event.is_set():
-
-                    # Prune dead processes
-                    processes = [x for x in processes if x.is_alive()]
-
-                    # Bring process list up to size
-                    while len(processes) < self.settings.num_processes:
-                        process = self.launch_process(import_queue, shutdown_event)
-                        processes.append(process)
-                        process.start()
-
-                    # Populate Queue
-                    if not await queue_builder.populate():
-                        logging.debug("Queue unable to populate: sleeping scheduler.")
-                        time.sleep(self.settings.full_queue_sleep_time)
-                    else:
-                        # Small sleep between populate attempts to prevent CPU/database pegging.
-                        time.sleep(0.05)
-            finally:
-                shutdown()
-
-    def launch_process(self, import_queue, shutdown_event):
-        process = mp.Process(
+        # Native queues hand work straight to the workers over a pipe, rather than through a manager
+        # process that every put and get would have to round trip through.
+        workers: List[Worker] = []
+        import_queue = WorkerQueues(workers)
+        queue_builder = QueueBuilder(import_queue, self.settings, self.writer, self.limiter, self.release)
+        shutdown_event = self.context.Event()
+
+        # Workers set this when the queue runs low or they find it empty, which wakes the scheduler.
+        demand = self.context.Event()
+
+        shutdown_started = []
+
+        # Inline function to implicitly pass through shutdown_event.
+        def shutdown(a=None, b=None):
+            if a != None:
+                logging.debug(f"Signal {a} caught.")
+
+            # A second signal can arrive while this is running- re-entering it would deadlock on the queue.
+            if shutdown_started:
+                return
+            shutdown_started.append(True)
+
+            # Send shutdown signal to all processes, and wake any that are waiting on an empty queue.
+            shutdown_event.set()
+            for worker in workers:
+                try:
+                    worker.queue.put_nowait("close")
+                except Full:
+                    pass
+
+                # Anything still buffered won't be read, so don't wait on it being flushed at exit.
+                worker.queue.cancel_join_thread()
+
+            # Graceful shutdown- wait for children to shut down.
+            if a == 15 or a == None:
+                logging.debug("Gracefully shutting down child processes.")
+                shutdown_start = time.time()
+                # Checking active children also reaps the ones that have exited, which would otherwise sit
+                # around as zombies and look alive.
+                while len(mp.active_children()) > 0:
+                    if time.time() > (shutdown_start + self.settings.graceful_shutdown_timeout):
+                        break
+                    time.sleep(0.05)
+
+            # Kill any remaining processes directly, not counting on variables. Workers started by a
+            # forkserver aren't children of this process, and they only stop taking jobs when terminated.
+            for worker_process in mp.active_children():
+                worker_process.kill()
+            remaining_processes = psutil.Process().children()
+            if len(remaining_processes) > 0:
+                logging.debug("Terminating remaining child processes.")
+                for process in remaining_processes:
+                    process.terminate()
+
+        # Set shutdown function as signal handler for SIGINT and SIGTERM.
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        # Now start actual script.
+        loop = asyncio.get_running_loop()
+        next_batch = asyncio.create_task(self.fetch(queue_builder))
+        try:
+            while not shutdown_event.is_set():
+
+                # Prune dead processes, including retired ones that have finished their last jobs.
+                for worker in [x for x in workers if not x.process.is_alive()]:
+                    workers.remove(worker)
+                    queue_builder.requeue(self.drain(worker))
+
+                await self.autoscale([x for x in workers if not x.retire.is_set()])
+
+                # Bring process list up to size
+                while len([x for x in workers if not x.retire.is_set()]) < self.target_processes:
+                    worker = self.launch_worker(self.context.Queue(self.worker_queue_size), shutdown_event, demand)
+                    workers.append(worker)
+                    worker.process.start()
+
+                # The next batch has usually been fetched while the workers drained the last one.
+                batch = await next_batch if next_batch else []
+                metrics.increment("scheduler.queued", await queue_builder.enqueue(batch))
+                next_batch = None
+
+                if not batch and not queue_builder.pending:
+                    # Nothing is due- check back later rather than querying constantly.
+                    logging.debug("No work available: sleeping scheduler.")
+                    metrics.increment("scheduler.no_work")
+                    await asyncio.sleep(self.settings.no_work_sleep_time)
+                    next_batch = asyncio.create_task(self.fetch(queue_builder))
+                    continue
+
+                # Start pulling the next batch now so it's ready as soon as the workers want it.
+                if len(queue_builder.pending) < self.settings.lookup_block_size:
+                    next_batch = asyncio.create_task(self.fetch(queue_builder))
+
+                # Wait for the workers to ask for more. The timeout makes sure dead workers get replaced.
+                with metrics.timed("scheduler.idle"):
+                    await loop.run_in_executor(None, demand.wait, self.settings.demand_wait_timeout)
+                demand.clear()
+                metrics.log_metrics_periodically(self.settings.metrics_log_interval, "scheduler ")
+        finally:
+            if next_batch:
+                next_batch.cancel()
+            shutdown()
+            metrics.log_metrics("scheduler ")
+
+    async def autoscale(self, workers: List[Worker]) -> None:
+        if (self.settings.min_processes or self.settings.num_processes) == (
+            self.settings.max_processes or self.settings.num_processes
+        ):
+            return
+        if time.monotonic() - self.last_scaled < self.settings.autoscale_interval:
+            return
+        self.last_scaled = time.monotonic()
+
+        in_flight = sum(x.in_flight.value for x in workers)
+        try:
+            backlog_age = await self.backlog() if self.backlog else None
+        except Exception:
+            logging.exception("Unable to measure the backlog for autoscaling.")
+            backlog_age = None
+        cpu_percent = psutil.cpu_percent(interval=None)
+        memory_percent = psutil.virtual_memory().percent
+
+        metrics.set_gauge("autoscale.workers", len(workers))
+        metrics.set_gauge("autoscale.in_flight", in_flight)
+        metrics.set_gauge("autoscale.cpu_percent", cpu_percent)
+        metrics.set_gauge("autoscale.memory_percent", memory_percent)
+        if backlog_age is not None:
+            metrics.set_gauge("autoscale.backlog_age", backlog_age)
+
+        change, reason = get_scaling_decision(
+            self.settings, len(workers), in_flight, backlog_age, cpu_percent, memory_percent
+        )
+        if change == 0:
+            logging.debug(f"Keeping {len(workers)} workers: {reason}.")
+            return
+
+        self.target_processes = len(workers) + change
+        logging.info(f"Scaling workers from {len(workers)} to {self.target_processes}: {reason}.")
+        if change > 0:
+            metrics.increment("autoscale.up")
+            return
+
+        # The least busy worker is retired- it stops taking new jobs and exits once its last one finishes.
+        metrics.increment("autoscale.down")
+        min(workers, key=lambda x: x.in_flight.value).retire.set()
+
+    def drain(self, worker: Worker) -> List:
+        """Takes back whatever was left in a stopped worker's queue.
+
+        Workers that died while waiting on their queue may still hold its lock, in which case nothing can
+        be read back. Those ids come due again when their claims run out.
+        """
+        ids = []
+        try:
+            while True:
+                id = worker.queue.get_nowait()
+                if id != "close":
+                    ids.append(id)
+        except Empty:
+            pass
+        lost = get_queue_size(worker.queue)
+        if lost:
+            logging.warning(f"{worker.process.name} stopped with {lost} jobs that couldn't be taken back.")
+            metrics.increment("queue.lost", lost)
+        worker.queue.cancel_join_thread()
+        worker.queue.close()
+        return ids
+
+    async def fetch(self, queue_builder: QueueBuilder) -> List:
+        with metrics.timed("scheduler.fetch"):
+            return await queue_builder.fetch()
+
+    def launch_worker(self, import_queue, shutdown_event, demand) -> Worker:
+        in_flight = self.context.Value("i", 0, lock=False)
+        retire = self.context.Event()
+        process = self.context.Process(
             target=reader_process,
             args=(
                 import_queue,
                 shutdown_event,
+                demand,
+                in_flight,
+                retire,
                 self.reader,
-                self.settings.dict(),
+                self.settings.copy(update={"worker_queue_size": self.worker_queue_size}).dict(),
+                time.time(),
             ),
         )
         process.name = f"worker_{self.worker_launches:03d}"
         self.worker_launches += 1
         logging.debug(f"Launching worker {process.name}")
         process.daemon = True
-        return process
+        return Worker(process, import_queue, in_flight, retire)
 
 
-def reader_process(queue, shutdown_event, reader: Callable, settings: dict):
-    asyncio.run(reader_runner(queue, shutdown_event, reader, settings))
+def reader_process(
+    queue, shutdown_event, demand, in_flight, retire, reader: Callable, settings: dict, launched_at: float
+):
+    # The parent decides when workers stop, so interrupts sent to the whole process group are ignored. A
+    # terminate stops this worker taking new jobs but lets the ones in flight finish.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, request_stop)
+    asyncio.run(reader_runner(queue, shutdown_event, demand, in_flight, retire, reader, settings, launched_at))
 
 
-async def reader_runner(queue, shutdown_event, reader: Callable, settings: dict):
+stop_requested = False
+
+
+def request_stop(signum=None, frame=None):
+    global stop_requested
+    stop_requested = True
+
+
+async def reader_runner(
+    queue, shutdown_event, demand, in_flight, retire, reader: Callable, settings: dict, launched_at: float
+):
     PROCESS_NAME = mp.current_process().name
     jobs_run = 0
 
@@ -197,28 +497,86 @@ async def reader_runner(queue, shutdown_event, reader: Callable, settings: dict)
     if not parent_process:
         raise ValueError("Function should be called as a child process.")
 
-    from fedimapper.services import db
+    from fedimapper.services import db, db_session
 
+    # Pooled connections inherited from the parent belong to it- drop them without closing them.
+    db_session.async_engine.sync_engine.dispose(close=False)
     engine = db.get_engine()
 
-    while not shutdown_event.is_set() and parent_process.is_alive():
+    # Forked workers start with a copy of the parent's metrics- only report their own.
+    metrics.reset()
+    metrics.observe("worker.start", time.time() - launched_at)
+
+    # Every job holds a slot until it completes, so no more than `concurrency` jobs are ever in flight
+    # and nothing is pulled off the shared queue until this process has room to work on it.
+    slots = asyncio.BoundedSemaphore(settings.get("concurrency", 1))
+    jobs = set()
+
+    async def run_job(id):
         try:
-            id = queue.get(True, settings["queue_interaction_timeout"])
-            if id == "close":
-                break
+            # Each job gets its own session so concurrent jobs never share a transaction.
             async with db.get_session_with_engine(engine) as session:
                 if inspect.iscoroutinefunction(reader):
                     await reader(session, id)
                 else:
                     reader(session, id)
+        except Exception:
+            logging.exception(f"{PROCESS_NAME} was unable to process {id}.")
+        finally:
+            slots.release()
+            metrics.log_metrics_periodically(settings.get("metrics_log_interval", 300), f"{PROCESS_NAME} ")
+
+    # The parent reads how many jobs are running here when deciding whether to scale the pool.
+    def job_done(job):
+        jobs.discard(job)
+        in_flight.value = len(jobs)
+
+    loop = asyncio.get_running_loop()
+    low_watermark = settings["worker_queue_size"] * settings["queue_low_watermark"]
+
+    try:
+        while not stop_requested and not shutdown_event.is_set() and parent_process.is_alive():
+            await slots.acquire()
+            try:
+                # Take work straight off the queue when there is some, otherwise block in a thread so
+                # running jobs carry on. The timeout only bounds how long a shutdown takes to notice.
+                id = queue.get_nowait()
+            except Empty:
+                # Retired workers finish what was already queued for them before exiting.
+                if retire.is_set():
+                    slots.release()
+                    break
+
+                # This process has room for work but none is queued.
+                metrics.increment("queue.starved")
+                demand.set()
+                try:
+                    with metrics.timed("queue.starved_wait"):
+                        id = await loop.run_in_executor(None, queue.get, True, settings["queue_get_timeout"])
+                except Empty:
+                    slots.release()
+                    logging.debug(f"{PROCESS_NAME} has no jobs to process.")
+                    continue
+
+            if not demand.is_set() and get_queue_size(queue) <= low_watermark:
+                demand.set()
+
+            if id == "close":
+                slots.release()
+                break
+
+            job = asyncio.create_task(run_job(id))
+            jobs.add(job)
+            job.add_done_callback(job_done)
+            in_flight.value = len(jobs)
 
             if settings.get("max_jobs_per_process", None):
                 jobs_run += 1
                 if jobs_run >= settings["max_jobs_per_process"]:
                     logging.info(f"{PROCESS_NAME} has reached max_jobs_per_process, exiting.")
                     return
-
-        except Empty:
-            logging.debug(f"{PROCESS_NAME} has no jobs to process, sleeping.")
-            time.sleep(settings["empty_queue_sleep_time"])
-            continue
+    finally:
+        # Let in flight jobs finish before the process exits.
+        if len(jobs) > 0:
+            await asyncio.gather(*jobs, return_exceptions=True)
+        metrics.log_metrics(f"{PROCESS_NAME} ")
@@ -0,0 +1,66 @@
+import pytest
+
+from fedimapper.services import asn_index, networking
+
+PREFIXES = """1.0.0.0\t24\t13335
+192.0.0.0\t16\t64500
+192.0.2.0\t24\t64501
+192.0.2.0\t24\t64501
+198.51.100.0\t24\t64502_64503
+2001:db8::\t32\t64504
+2001:db8:1::\t48\t64505
+2001:db8:2::\t96\t64506
+"""
+
+NAMES = """13335 CLOUDFLARENET, US
+64500 HETZNER-AS, DE
+64504 EXAMPLE-V6 Example Networks, NL
+"""
+
+
+@pytest.fixture
+def index(tmp_path):
+    prefix_file = tmp_path / "routeviews.pfx2as"
+    prefix_file.write_text(PREFIXES)
+    names_file = tmp_path / "asn.txt"
+    names_file.write_text(NAMES)
+    output = tmp_path / "asn.idx"
+    asn_index.build_index([prefix_file], names_file, output)
+    return asn_index.ASNIndex(output)
+
+
+def test_flatten_nested_prefixes():
+    ranges = asn_index.flatten(
+        [
+            asn_index.Prefix(0, 1023, 1, 22),
+            asn_index.Prefix(256, 511, 2, 24),
+            asn_index.Prefix(768, 1023, 3, 24),
+        ]
+    )
+    assert [(x.start, x.end, x.asn) for x in ranges] == [(0, 255, 1), (256, 511, 2), (512, 767, 1), (768, 1023, 3)]
+
+
+def test_longest_prefix_match(index):
+    assert index.lookup("192.0.2.1").asn == "64501"
+    assert index.lookup("192.0.2.1").prefix == "192.0.2.0/24"
+    assert index.lookup("192.0.3.1").asn == "64500"
+    assert index.lookup("192.0.3.1").prefix == "192.0.0.0/16"
+    assert index.lookup("198.51.100.7").asn == "64502"
+    assert index.lookup("203.0.113.1") is None
+    assert index.lookup("0.0.0.1") is None
+
+
+def test_ipv6_lookup(index):
+    assert index.lookup("2001:db8::1").asn == "64504"
+    assert index.lookup("2001:db8:1::1").asn == "64505"
+    # Routes longer than a /64 are ignored.
+    assert index.lookup("2001:db8:2::1").asn == "64504"
+    assert index.lookup("2001:db9::1") is None
+
+
+def test_owner_data_matches_whois(index):
+    record = index.lookup("1.0.0.1")
+    assert record.owner == "CLOUDFLARENET, US"
+    assert record.cc == "US"
+    assert networking.clean_asn_company(record.owner) == "CLOUDFLARE"
+    assert index.lookup("192.0.2.1").owner is None
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from fedimapper.services import asn_lookup
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    asn_lookup.prefix_cache.clear()
+    asn_lookup.unannounced_cache.clear()
+    asn_lookup.prefix_lengths[4].clear()
+    asn_lookup.prefix_lengths[6].clear()
+
+
+def test_longest_prefix_wins():
+    asn_lookup.add_to_cache(asn_lookup.ASNRecord(asn="1", prefix="192.0.0.0/16"))
+    asn_lookup.add_to_cache(asn_lookup.ASNRecord(asn="2", prefix="192.0.2.0/24"))
+    asn_lookup.add_to_cache(asn_lookup.ASNRecord(asn="3", prefix="2001:db8::/32"))
+
+    assert asn_lookup.get_cached("192.0.2.10").asn == "2"
+    assert asn_lookup.get_cached("192.0.3.10").asn == "1"
+    assert asn_lookup.get_cached("2001:db8::1").asn == "3"
+    assert asn_lookup.get_cached("198.51.100.1") is None
+
+
+def test_lookups_are_batched(monkeypatch):
+    batches = []
+
+    def lookupmany(ips):
+        batches.append(sorted(ips))
+        return {"192.0.2.1": asn_lookup.ASNRecord(asn="64500", prefix="192.0.2.0/24", cc="US", owner="EXAMPLE, US")}
+
+    monkeypatch.setattr(asn_lookup, "lookupmany", lookupmany)
+    # Lookups are only held back for a batch while other ingests are running.
+    monkeypatch.setattr(asn_lookup.www, "active_sessions", 3)
+
+    async def lookup_all():
+        return await asyncio.gather(
+            asn_lookup.get_asn_data("192.0.2.1"),
+            asn_lookup.get_asn_data("192.0.2.2"),
+            asn_lookup.get_asn_data("198.51.100.1"),
+        )
+
+    first, second, unannounced = asyncio.run(lookup_all())
+    assert batches == [["192.0.2.1", "192.0.2.2", "198.51.100.1"]]
+    assert first.asn == "64500"
+    assert second.asn == "64500"
+    assert unannounced is None
+
+    # Both the announced prefix and the unannounced address are now answered without whois.
+    assert asyncio.run(asn_lookup.get_asn_data("192.0.2.200")).asn == "64500"
+    assert asyncio.run(asn_lookup.get_asn_data("198.51.100.1")) is None
+    assert len(batches) == 1
+
+
+def test_single_lookup_skips_batch_wait(monkeypatch):
+    batches = []
+
+    def lookupmany(ips):
+        batches.append(ips)
+        return {}
+
+    monkeypatch.setattr(asn_lookup, "lookupmany", lookupmany)
+    monkeypatch.setattr(asn_lookup.settings, "asn_lookup_batch_wait", 60)
+
+    async def lookup():
+        return await asyncio.wait_for(asn_lookup.get_asn_data("198.51.100.1"), 5)
+
+    assert asyncio.run(lookup()) is None
+    assert batches == [["198.51.100.1"]]
+
+
+def test_known_prefixes_retried_after_failure(monkeypatch):
+    class BrokenSession:
+        async def execute(self, statement):
+            raise RuntimeError("database is unavailable")
+
+    monkeypatch.setattr(asn_lookup, "known_prefixes_loaded", False)
+    with pytest.raises(RuntimeError):
+        asyncio.run(asn_lookup.load_known_prefixes(BrokenSession()))
+    assert not asn_lookup.known_prefixes_loaded
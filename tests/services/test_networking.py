@@ -1,3 +1,6 @@
+import asyncio
+
+import httpx
 import pytest
 
 from fedimapper.services import networking
@@ -37,3 +40,20 @@ COMPANY_TESTS = [
 def test_asn_company_clean():
     for test in COMPANY_TESTS:
         assert networking.clean_asn_company(test[1]) == test[0]
+
+
+def test_asn_company_clean_without_owner():
+    assert networking.clean_asn_company(None) is None
+
+
+def test_can_access_https_truncated_multibyte(monkeypatch):
+    # Cut off partway through the three bytes of the final character.
+    body = "日本語のページ".encode("utf-8")[:-1]
+
+    async def get_partial(url, size, **kwargs):
+        return httpx.Response(200), body
+
+    monkeypatch.setattr(networking, "get_partial", get_partial)
+    response, content = asyncio.run(networking.can_access_https("example.jp"))
+    assert response
+    assert content == "日本語のペー"
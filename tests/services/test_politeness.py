@@ -0,0 +1,53 @@
+import pytest
+
+from fedimapper.services import politeness
+
+
+def test_token_bucket_refills():
+    bucket = politeness.TokenBucket(rate=1, burst=2, now=0)
+    assert bucket.available(0)
+    bucket.consume()
+    bucket.consume()
+    assert not bucket.available(0.5)
+    assert bucket.available(1.0)
+
+
+def test_shared_ip_is_limited():
+    limiter = politeness.OriginLimiter(ip_rate=1, ip_burst=2, asn_rate=100, asn_burst=100)
+    for host in ["a.example", "b.example", "c.example"]:
+        limiter.remember(host, "192.0.2.1", "64500")
+    limiter.remember("d.example", "192.0.2.2", "64500")
+
+    assert limiter.acquire("a.example", now=0)
+    assert limiter.acquire("b.example", now=0)
+    assert not limiter.acquire("c.example", now=0)
+
+    # Other ready work on a different address is still handed out.
+    assert limiter.acquire("d.example", now=0)
+    assert limiter.acquire("c.example", now=1)
+
+
+def test_shared_asn_is_limited():
+    limiter = politeness.OriginLimiter(ip_rate=100, ip_burst=100, asn_rate=1, asn_burst=1)
+    limiter.remember("a.example", "192.0.2.1", "64500")
+    limiter.remember("b.example", "192.0.2.2", "64500")
+    assert limiter.acquire("a.example", now=0)
+    assert not limiter.acquire("b.example", now=0)
+
+
+def test_unknown_origins_are_not_limited():
+    limiter = politeness.OriginLimiter(ip_rate=0, ip_burst=0, asn_rate=0, asn_burst=0)
+    assert limiter.acquire("new.example", now=0)
+
+
+def test_get_wait():
+    limiter = politeness.OriginLimiter(ip_rate=0.5, ip_burst=1, asn_rate=100, asn_burst=100)
+    limiter.remember("a.example", "192.0.2.1", "64500")
+    limiter.remember("b.example", "192.0.2.1", "64500")
+    assert limiter.get_wait("a.example", now=0) == 0
+    assert limiter.acquire("a.example", now=0)
+
+    # The address needs another two seconds to refill after the token that was just taken.
+    assert limiter.get_wait("b.example", now=0) == 2.0
+    assert limiter.get_wait("b.example", now=1.5) == 0.5
+    assert limiter.get_wait("new.example", now=0) == 0
@@ -0,0 +1,84 @@
+import asyncio
+
+import httpx
+import pytest
+
+from fedimapper.services import replay
+
+
+def test_corpus_round_trip(tmp_path):
+    corpus = replay.Corpus(tmp_path / "corpus.db")
+    corpus.save_response("GET", "https://example.social/", 200, [("content-type", "text/html")], b"hello")
+    corpus.save_lookup("dns", "example.social", {"ipv4": "127.0.0.1"})
+    corpus.add_host("example.social")
+    corpus.add_host("example.social")
+
+    assert corpus.get_response("GET", "https://example.social/") == (200, [("content-type", "text/html")], b"hello")
+    assert corpus.get_response("GET", "https://missing.social/") is None
+    assert corpus.get_lookup("dns", "example.social") == (True, {"ipv4": "127.0.0.1"})
+    assert corpus.get_lookup("dns", "missing.social") == (False, None)
+    assert corpus.get_hosts() == ["example.social"]
+
+
+def test_replay_transport(tmp_path):
+    corpus = replay.Corpus(tmp_path / "corpus.db")
+    corpus.save_response("GET", "https://example.social/api/v1/instance/peers", 200, [], b'["one.social"]')
+    corpus.save_response("GET", "https://slow.social/", 0, [(replay.ERROR_HEADER, "ReadTimeout")], b"")
+
+    async def check():
+        async with httpx.AsyncClient(transport=replay.ReplayTransport(corpus)) as client:
+            response = await client.get("https://example.social/api/v1/instance/peers")
+            assert response.status_code == 200
+            assert response.json() == ["one.social"]
+
+            with pytest.raises(httpx.ReadTimeout):
+                await client.get("https://slow.social/")
+
+            with pytest.raises(httpx.ConnectError):
+                await client.get("https://missing.social/")
+
+    asyncio.run(check())
+
+
+def test_recording_transport(tmp_path, monkeypatch):
+    monkeypatch.setattr(replay.settings, "replay_max_body_bytes", 4)
+    corpus = replay.Corpus(tmp_path / "corpus.db")
+
+    def respond(request):
+        if "if-none-match" in request.headers:
+            return httpx.Response(304)
+        return httpx.Response(200, headers={"ETag": '"abc"'}, content=b'["one.social"]')
+
+    async def check():
+        transport = replay.RecordingTransport(httpx.MockTransport(respond), corpus)
+        async with httpx.AsyncClient(transport=transport) as client:
+            response = await client.get("https://example.social/peers")
+            assert response.content == b'["one.social"]'
+            response = await client.get("https://example.social/peers", headers={"If-None-Match": '"abc"'})
+            assert response.status_code == 304
+
+    asyncio.run(check())
+
+    # Bodies are only recorded up to the limit.
+    status_code, headers, body = corpus.get_response("GET", "https://example.social/peers")
+    assert status_code == 200 and body == b'["on'
+
+    # Conditional requests are kept apart from the full download.
+    variant = replay.get_variant(
+        httpx.Request("GET", "https://example.social/peers", headers={"If-None-Match": '"abc"'})
+    )
+    assert corpus.get_response("GET", "https://example.social/peers", variant)[0] == 304
+
+
+def test_replay_transport_partial_body(tmp_path):
+    corpus = replay.Corpus(tmp_path / "corpus.db")
+    corpus.save_response("GET", "https://slow.social/peers", 200, [(replay.ERROR_HEADER, "ReadTimeout")], b'["one')
+
+    async def check():
+        async with httpx.AsyncClient(transport=replay.ReplayTransport(corpus)) as client:
+            async with client.stream("GET", "https://slow.social/peers") as response:
+                assert response.status_code == 200
+                with pytest.raises(httpx.ReadTimeout):
+                    await response.aread()
+
+    asyncio.run(check())
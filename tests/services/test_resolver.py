@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from fedimapper.services import resolver
+from fedimapper.settings import settings
+
+
+def fake_lookup(records):
+    async def lookup_record(host, record_type):
+        return records.get(record_type, (None, 0))
+
+    return lookup_record
+
+
+def test_lookup_host_dual_stack(monkeypatch):
+    monkeypatch.setattr(resolver, "lookup_record", fake_lookup({"A": ("192.0.2.1", 300), "AAAA": ("2001:db8::1", 120)}))
+    addresses = asyncio.run(resolver.lookup_host("example.com"))
+    assert addresses.ipv4 == "192.0.2.1"
+    assert addresses.ipv6 == "2001:db8::1"
+    assert addresses.address == "192.0.2.1"
+    assert addresses.ttl == 120
+
+
+def test_lookup_host_ipv6_only(monkeypatch):
+    monkeypatch.setattr(resolver, "lookup_record", fake_lookup({"AAAA": ("2001:db8::1", 1)}))
+    addresses = asyncio.run(resolver.lookup_host("example.com"))
+    assert addresses.ipv4 is None
+    assert addresses.address == "2001:db8::1"
+    assert addresses.ttl == settings.dns_min_ttl
+
+
+def test_lookup_host_no_dns(monkeypatch):
+    monkeypatch.setattr(resolver, "lookup_record", fake_lookup({}))
+    addresses = asyncio.run(resolver.lookup_host("example.com"))
+    assert addresses.address is None
+    assert addresses.ttl == settings.dns_negative_ttl
+
+
+def test_resolve_host_caches(monkeypatch):
+    calls = []
+
+    async def lookup_host(host):
+        calls.append(host)
+        return resolver.HostAddresses(ipv4="192.0.2.1", ttl=300)
+
+    monkeypatch.setattr(resolver, "lookup_host", lookup_host)
+    resolver.dns_cache.clear()
+
+    async def resolve_twice():
+        return await asyncio.gather(resolver.resolve_host("cached.example"), resolver.resolve_host("cached.example"))
+
+    asyncio.run(resolve_twice())
+    asyncio.run(resolver.resolve_host("cached.example"))
+    assert calls == ["cached.example"]
+
+
+def test_lookup_host_timeout(monkeypatch):
+    monkeypatch.setattr(resolver, "lookup_record", fake_lookup({"A": (None, None)}))
+    addresses = asyncio.run(resolver.lookup_host("example.com"))
+    assert addresses.address is None
+    assert addresses.timed_out
+
+
+def test_resolve_host_skips_caching_timeouts(monkeypatch):
+    calls = []
+
+    async def lookup_host(host):
+        calls.append(host)
+        return resolver.HostAddresses(timed_out=True)
+
+    monkeypatch.setattr(resolver, "lookup_host", lookup_host)
+    resolver.dns_cache.clear()
+
+    asyncio.run(resolver.resolve_host("slow.example"))
+    asyncio.run(resolver.resolve_host("slow.example"))
+    assert calls == ["slow.example", "slow.example"]
@@ -0,0 +1,140 @@
+import asyncio
+
+import httpx
+
+from fedimapper.services import www
+
+
+def test_host_session_client():
+    async def check():
+        assert www.get_client() == (www.client, {})
+        async with www.host_session() as session:
+            request_client, extensions = www.get_client()
+            assert request_client is session.client
+            assert extensions["trace"] == session.trace
+            assert session.requests == 1
+        assert www.get_client()[0] is www.client
+        assert session.client.is_closed
+
+    asyncio.run(check())
+
+
+def test_host_session_counts_handshakes():
+    async def check():
+        async with www.host_session() as session:
+            await session.trace("connection.connect_tcp.complete", {})
+            await session.trace("connection.start_tls.complete", {})
+            await session.trace("http11.send_request_headers.complete", {})
+        assert session.tcp_connections == 1
+        assert session.tls_handshakes == 1
+
+    asyncio.run(check())
+
+
+def test_host_session_timeouts():
+    async def check():
+        async with www.host_session() as session:
+            timeout, limit = session.get_timeout(10)
+            assert timeout.read == 10 and limit == 10
+
+            # Quick hosts fail fast, but never below the minimum.
+            session.load_latency(0.1, 0.01)
+            timeout, limit = session.get_timeout(10)
+            assert timeout.connect == www.settings.timeout_min
+            assert timeout.read == www.settings.timeout_min
+            assert limit == 10
+
+            # Slow but steady hosts get more time than the default, up to the maximum.
+            session.load_latency(8, 2)
+            timeout, limit = session.get_timeout(10)
+            assert timeout.connect == 16
+            assert timeout.read == www.settings.timeout_max
+            assert limit == www.settings.timeout_max
+
+    asyncio.run(check())
+
+
+def test_host_session_timeouts_capped_at_default():
+    async def check():
+        async with www.host_session() as session:
+            # Fast hosts never get longer than the caller asked for, even below the minimum.
+            session.load_latency(0.1, 0.01)
+            timeout, limit = session.get_timeout(1.0)
+            assert timeout.connect == 1.0
+            assert timeout.read == 1.0
+            assert limit == 1.0
+
+            # Only a history of being slow earns more time than the default.
+            session.load_latency(0.5, 0.25)
+            timeout, limit = session.get_timeout(1.0)
+            assert timeout.connect == www.settings.timeout_min
+            assert timeout.read == 3.0
+            assert limit == 3.0
+
+    asyncio.run(check())
+
+
+def test_host_session_latency_average():
+    async def check():
+        async with www.host_session() as session:
+            session.observe_latency(1.0)
+            assert session.latency_average == 1.0
+            assert session.latency_deviation == 0.5
+            for _ in range(50):
+                session.observe_latency(0.2)
+            assert abs(session.latency_average - 0.2) < 0.01
+            assert session.latency_deviation < 0.01
+            assert session.latency_samples == 51
+
+    asyncio.run(check())
+
+
+def test_close_prefetched_cancels_pending():
+    class Context:
+        closed = False
+
+        async def __aexit__(self, *args):
+            self.closed = True
+
+    context = Context()
+
+    async def stalled():
+        await asyncio.sleep(300)
+
+    async def ready():
+        return context, None, None
+
+    async def check():
+        async with www.host_session() as session:
+            stalled_task = asyncio.create_task(stalled())
+            ready_task = asyncio.create_task(ready())
+            await asyncio.sleep(0)
+            session.prefetched = {"stalled": ({}, stalled_task), "ready": ({}, ready_task)}
+            await asyncio.wait_for(www.close_prefetched(session), 1)
+        assert stalled_task.cancelled()
+        assert context.closed
+
+    asyncio.run(check())
+
+
+def test_host_session_keeps_validators(monkeypatch):
+    async def get_validator_headers(url):
+        return {}
+
+    async def save_validators(session, validators):
+        raise AssertionError("Validators were written outside of the ingest's transaction.")
+
+    def respond(request):
+        return httpx.Response(200, headers={"ETag": '"abc"'}, content=b"[]")
+
+    monkeypatch.setattr(www, "get_validator_headers", get_validator_headers)
+    monkeypatch.setattr(www, "save_validators", save_validators)
+    monkeypatch.setattr(www, "transport_wrapper", lambda transport: httpx.MockTransport(respond))
+
+    async def check():
+        async with www.host_session() as session:
+            await www.get_safe("https://example.com/peers", validate_robots=False, conditional=True)
+        return session.validators
+
+    validators = asyncio.run(check())
+    assert validators["https://example.com/peers"]["etag"] == '"abc"'
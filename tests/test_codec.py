@@ -0,0 +1,26 @@
+import pytest
+
+from fedimapper.utils import codec
+
+PAYLOAD = {
+    "software": "mastodon",
+    "hosts": [f"host-{i}.example" for i in range(100)],
+    "counts": {"users": 12, "ratio": 0.5, "open": True, "missing": None},
+    "title": "ünïcödé 🚀",
+}
+
+
+@pytest.mark.parametrize("backend", list(codec.BACKENDS.keys()))
+def test_round_trip(backend):
+    functions = codec.BACKENDS[backend]
+    assert functions["loads"](functions["dumps"](PAYLOAD)) == PAYLOAD
+
+
+@pytest.mark.parametrize("backend", list(codec.BACKENDS.keys()))
+def test_matches_stdlib_output(backend):
+    assert codec.BACKENDS[backend]["dumps"](PAYLOAD) == codec.stdlib_dumps(PAYLOAD)
+
+
+@pytest.mark.parametrize("backend", list(codec.BACKENDS.keys()))
+def test_loads_control_characters(backend):
+    assert codec.BACKENDS[backend]["loads"](b'{"comment": "line\nbreak"}') == {"comment": "line\nbreak"}
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from fedimapper.utils.json_stream import JSONArrayParser, JSONStreamException
+
+
+def parse_in_chunks(data: bytes, size: int):
+    parser = JSONArrayParser()
+    items = []
+    for i in range(0, len(data), size):
+        items.extend(parser.feed(data[i : i + size]))
+    items.extend(parser.close())
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1024])
+def test_chunked_array(size):
+    document = [
+        "mastodon.social",
+        {"domain": "bad.example", "comment": "spam ünïcödé 🚫"},
+        12345,
+        -1.5e3,
+        True,
+        None,
+        [],
+    ]
+    assert parse_in_chunks(json.dumps(document, ensure_ascii=False).encode("utf-8"), size) == document
+
+
+def test_number_at_chunk_boundary():
+    parser = JSONArrayParser()
+    assert parser.feed(b"[12") == []
+    assert parser.feed(b"34, 5") == [1234]
+    assert parser.feed(b"6]") == [56]
+    assert parser.close() == []
+
+
+def test_empty_array():
+    assert parse_in_chunks(b" [ ] ", 1) == []
+
+
+def test_not_an_array():
+    with pytest.raises(JSONStreamException):
+        parse_in_chunks(b'{"error": "not found"}', 4)
+
+
+def test_truncated_array():
+    with pytest.raises(JSONStreamException):
+        parse_in_chunks(b'["a.example", "b.exa', 4)
+
+
+def test_item_size_limit():
+    parser = JSONArrayParser(max_item_size=10)
+    with pytest.raises(JSONStreamException):
+        parser.feed(b'["' + b"a" * 20)
@@ -0,0 +1,113 @@
+import asyncio
+import queue
+import threading
+
+import pytest
+
+from fedimapper.utils.queuerunner import (
+    QueueBuilder,
+    Settings,
+    Worker,
+    WorkerQueues,
+    get_scaling_decision,
+)
+
+
+class RejectLimiter:
+    def __init__(self, rejected):
+        self.rejected = rejected
+
+    def acquire(self, id):
+        return id not in self.rejected
+
+    def get_wait(self, id):
+        return 2.0
+
+
+class FakeProcess:
+    def __init__(self, alive=True):
+        self.alive = alive
+
+    def is_alive(self):
+        return self.alive
+
+
+def make_worker(size, alive=True):
+    return Worker(FakeProcess(alive), queue.Queue(size), None, threading.Event())
+
+
+def test_enqueue_releases_skipped_ids():
+    released = []
+    delayed = {}
+
+    async def writer(desired):
+        for i in range(desired):
+            yield f"host-{i}"
+
+    async def release(ids, delays):
+        released.extend(ids)
+        delayed.update(delays)
+
+    async def populate(builder):
+        return await builder.enqueue(await builder.fetch())
+
+    # Only eight ids fit in the queue, so the rest are held back for the next call.
+    settings = Settings(max_queue_size=10, lookup_block_size=4, limited_lookup_multiplier=3)
+    work_queue = queue.Queue(settings.max_queue_size)
+    builder = QueueBuilder(work_queue, settings, writer, RejectLimiter({"host-0"}), release)
+    assert asyncio.run(populate(builder)) == 8
+
+    assert [work_queue.get_nowait() for _ in range(work_queue.qsize())] == [f"host-{i}" for i in range(1, 9)]
+    assert released == ["host-0"]
+    assert delayed == {"host-0": 2.0}
+    assert builder.pending == ["host-9", "host-10", "host-11"]
+
+
+def test_get_scaling_decision():
+    settings = Settings(num_processes=2, min_processes=1, max_processes=4, concurrency=4)
+
+    # Overdue work with busy workers grows the pool, until it reaches the maximum.
+    assert get_scaling_decision(settings, 2, 8, 3600, 20, 20)[0] == 1
+    assert get_scaling_decision(settings, 4, 16, 3600, 20, 20)[0] == 0
+
+    # Overdue work with idle workers is held up somewhere else, so more workers won't help.
+    assert get_scaling_decision(settings, 2, 1, 3600, 20, 20)[0] == 0
+
+    # No backlog and idle workers shrinks the pool, until it reaches the minimum.
+    assert get_scaling_decision(settings, 2, 0, 0, 20, 20)[0] == -1
+    assert get_scaling_decision(settings, 1, 0, 0, 20, 20)[0] == 0
+
+    # A busy machine shrinks the pool even when there is a backlog.
+    assert get_scaling_decision(settings, 3, 12, 3600, 95, 20)[0] == -1
+    assert get_scaling_decision(settings, 3, 12, 3600, 20, 95)[0] == -1
+
+
+def test_worker_queues():
+    workers = [make_worker(2), make_worker(2), make_worker(2, alive=False)]
+    worker_queues = WorkerQueues(workers)
+
+    # Work is spread over the live workers, and stops once all of their queues are full.
+    for i in range(4):
+        worker_queues.put(f"host-{i}", True, 0.01)
+    assert [x.queue.qsize() for x in workers] == [2, 2, 0]
+    assert worker_queues.qsize() == 4
+    with pytest.raises(queue.Full):
+        worker_queues.put("host-4", True, 0.01)
+
+    # Retired workers aren't given any more work.
+    workers[0].retire.set()
+    workers[1].queue.get_nowait()
+    worker_queues.put("host-4", True, 0.01)
+    assert workers[1].queue.qsize() == 2
+    assert worker_queues.qsize() == 2
+
+
+def test_requeue():
+    builder = QueueBuilder(queue.Queue(10), Settings(max_queue_size=10), None)
+    assert builder.add_to_queue("host-0")
+    builder.pending = ["host-1"]
+
+    # Requeued ids go first, and aren't held back for having been queued recently.
+    builder.requeue(["host-0"])
+    assert builder.pending == ["host-0", "host-1"]
+    assert builder.add_to_queue("host-0")
@@ -0,0 +1,94 @@
+import datetime
+import random
+
+import httpx
+
+from fedimapper.models.instance import (
+    INGEST_PRIORITY_DORMANT,
+    INGEST_PRIORITY_QUARANTINED,
+    INGEST_PRIORITY_STALE,
+    INGEST_PRIORITY_UNREACHABLE,
+    Instance,
+)
+from fedimapper.settings import settings
+from fedimapper.tasks import quarantine
+from fedimapper.tasks.ingest import get_backoff, is_reachable, schedule_next_ingest
+
+
+def test_is_reachable():
+    response = httpx.Response(206)
+    assert is_reachable(response, "<html><title>Mastodon</title></html>")
+    assert is_reachable(response, "")
+    assert not is_reachable(response, "<html>This domain parking page</html>")
+    assert not is_reachable(response, "<html>ERR_NGROK_3200</html>")
+
+
+def test_get_backoff(monkeypatch):
+    monkeypatch.setattr(random, "uniform", lambda a, b: 0)
+    assert get_backoff(1) == datetime.timedelta(hours=settings.unreachable_rescan_hours)
+    assert get_backoff(2) == datetime.timedelta(hours=settings.unreachable_rescan_hours * 2)
+    assert get_backoff(3) == datetime.timedelta(hours=settings.unreachable_rescan_hours * 4)
+    assert get_backoff(settings.dormant_after_failures - 1) == datetime.timedelta(
+        hours=settings.unreachable_backoff_max_hours
+    )
+    assert get_backoff(settings.dormant_after_failures) == datetime.timedelta(hours=settings.dormant_rescan_hours)
+
+
+def test_get_backoff_jitter():
+    base = datetime.timedelta(hours=settings.unreachable_rescan_hours * 4)
+    for _ in range(100):
+        backoff = get_backoff(3)
+        assert (
+            base * (1 - settings.unreachable_backoff_jitter)
+            <= backoff
+            <= base * (1 + settings.unreachable_backoff_jitter)
+        )
+
+
+def test_schedule_next_ingest(monkeypatch):
+    monkeypatch.setattr(random, "uniform", lambda a, b: 0)
+    instance = Instance(host="example.social", last_ingest=datetime.datetime(2026, 1, 1))
+
+    schedule_next_ingest(instance, 0)
+    assert instance.ingest_priority == INGEST_PRIORITY_STALE
+    assert instance.next_ingest_at == instance.last_ingest + datetime.timedelta(hours=settings.stale_rescan_hours)
+
+    schedule_next_ingest(instance, 1)
+    assert instance.ingest_priority == INGEST_PRIORITY_UNREACHABLE
+    assert instance.next_ingest_at > datetime.datetime.utcnow()
+
+    schedule_next_ingest(instance, settings.dormant_after_failures)
+    assert instance.ingest_priority == INGEST_PRIORITY_DORMANT
+
+
+def test_count_failure():
+    instance = Instance(host="example.social", crash_count=0, timeout_count=0)
+
+    for _ in range(settings.quarantine_after_failures - 1):
+        assert not quarantine.count_failure(instance, quarantine.CRASH)
+    assert instance.quarantined_until is None
+
+    # Timeouts and crashes add up to the same threshold.
+    assert quarantine.count_failure(instance, quarantine.TIMEOUT)
+    assert instance.ingest_priority == INGEST_PRIORITY_QUARANTINED
+    assert instance.next_ingest_at == instance.quarantined_until
+    assert instance.quarantined_until > datetime.datetime.utcnow()
+
+    quarantine.release(instance)
+    assert instance.crash_count == instance.timeout_count == 0
+    assert instance.quarantined_until is None
+
+
+def test_was_abandoned():
+    lease = datetime.timedelta(seconds=settings.ingest_lease_seconds)
+    claimed_at = datetime.datetime(2026, 1, 1)
+
+    # Ingested after it was claimed but never finished.
+    assert quarantine.was_abandoned("crawler", claimed_at + lease, claimed_at + datetime.timedelta(seconds=5))
+
+    # The claim ran out before any worker started on it.
+    assert not quarantine.was_abandoned("crawler", claimed_at + lease, claimed_at - datetime.timedelta(hours=1))
+    assert not quarantine.was_abandoned("crawler", claimed_at + lease, None)
+
+    # Finished ingests clear the claim.
+    assert not quarantine.was_abandoned(None, None, claimed_at)